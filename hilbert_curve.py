@@ -1,7 +1,17 @@
 import math
+import os
+import warnings
 import Image, ImageDraw
 import Tkinter as Tk
 import tkColorChooser
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import numba
+except ImportError:
+    numba = None
 
 '''
 A list of all the classes, methods and procedures used in the program:
@@ -19,15 +29,73 @@ class Curve:
         Calculates the following position for the curve using the current position, the segment
         length and the direction of the curve.
 
+    def makeLineList(self):
+        Creates the positions of every corner in the curve with the selected backend.
+
+    def iterPoints(self):
+        Generator that yields the positions of the corners in the curve one at a time.
+
+    def iterChunks(self, chunkSize = 65536):
+        Generator that yields the positions of the corners in the curve a chunk at a time.
+
     def drawCurve(self, draw):
         Draws a Hilbert curve using the positions stored in self.lineList.
 
-    def makeImage(self):
+    def drawCurveField(self, img):
+        Draws a Hilbert curve in one pass from the distance of every pixel to the curve.
+
+    def drawCurveDoubling(self, img):
+        Draws a Hilbert curve from copies of the curve of one order lower.
+
+    def doublingFaster(self):
+        Tells whether drawCurveDoubling(...) is expected to draw the curve faster than drawCurve(...).
+
+    def paintKeys(self, img, keys, scale):
+        Colours the pixels of an image from the pass and the segment that cover them.
+
+    def segmentColours(self, passNumbers, j):
+        Calculates the colours drawCurve(...) uses for the given passes and segments.
+
+    def exportPoints(self, fileName, chunkSize = 65536):
+        Writes the positions of the corners in the curve to a text file.
+
+    def makeImage(self, distanceField = False, pixelSize = None, supersample = 1, doubling = False,
+                  keepRaster = False):
         Creates an image with a Hilbert curve.
 
 def drawLine(draw, startPoint, endPoint, lineWidth, colour):
     Draws a line between two given points.
 
+def strokeKeys(keys, size, starts, ends, first, thickness, count):
+    Finds which pass of Curve.drawCurve(...) and which segment colour the pixels around segments.
+
+def strokeKeysLoop(keys, width, height, starts, ends, first, thickness, count):
+    Finds which pass of Curve.drawCurve(...) and which segment colour the pixels around segments, one pixel at a time.
+
+def doubleKeys(keys, order, step, margin, thickness, scale, flipped = False):
+    Builds the keys of the pixels around a Hilbert curve from the keys of the curve of one order lower.
+
+def stepVector(angle, size):
+    Calculates how far the curve moves in one segment in the given direction.
+
+def hilbertPoints(order):
+    Calculates the grid position of every corner in a Hilbert curve with NumPy array operations.
+
+def hilbertPointsAt(index, order):
+    Calculates the grid position of the corners with the given indices in a Hilbert curve.
+
+def curveDirections(order):
+    Calculates the direction of every segment in a Hilbert curve with NumPy array operations.
+
+def walkSteps(directions, first, stepsx, stepsy, points):
+    Adds up the segments of a curve one at a time.
+
+def fastestBackend():
+    Finds the fastest backend that can be imported.
+
+def selectBackend(name = None):
+    Chooses the implementation used for creating the corners of the curve.
+
     
 #############################################################################################
 
@@ -108,7 +176,12 @@ class Curve:
                     for the background of the curve.
         thickness: The width of the line.
         lineList: A list containing the positions of every corner in the
-                  curve.
+                  curve. With the backend "numpy" it is a NumPy array of shape
+                  (n, 2) instead, see makeLineList().
+        raster: None, or a tuple with the segment length, the thickness, whether the keys are
+                flipped, the order and the keys of the last curve drawn by
+                drawCurveDoubling(...), see doubleKeys(...). makeImage(...) only keeps it
+                when asked to with keepRaster.
     '''
     
     def __init__(self, order, position, angle, size):
@@ -134,6 +207,7 @@ class Curve:
         self.background = ((0, 255, 0), "#00FF00")
         self.thickness = 26
         self.lineList = []
+        self.raster = None
         
 
     def makeCurve(self, order, factor):
@@ -175,12 +249,108 @@ class Curve:
                  the segment length and the direction of the curve. self.position has been
                  updated.
         '''
-        if self.angle % 90 == 0:
-            self.position = (self.position[0] + int(math.cos(math.radians(self.angle))* self.size),
-                             self.position[1] + int(math.sin(math.radians(self.angle))* self.size))
-        else:
-            self.position = (self.position[0] + math.cos(math.radians(self.angle))* self.size,
-                             self.position[1] + math.sin(math.radians(self.angle))* self.size)          
+        step = stepVector(self.angle, self.size)
+        self.position = (self.position[0] + step[0], self.position[1] + step[1])
+
+    def makeLineList(self):
+        '''
+        Creates the positions of every corner in the curve with the selected backend.
+
+        self: An object of the class Curve.
+        On exit: The positions of every corner in the curve, starting at self.position, have
+                 been added to self.lineList, and self.position is the end of the curve. With
+                 the backend "python" this is done by makeCurve(...). With the backend "numpy"
+                 the corners are calculated all at once on the grid by hilbertPoints(...), and
+                 placed with one affine transform built from the segments stepVector(...) gives
+                 for self.angle and the angle a quarter turn before it. The array is kept as
+                 self.lineList, since converting millions of corners to tuples takes far longer
+                 than calculating them. For the backend "numba" the direction of every segment
+                 is calculated by curveDirections(...), the segments for the few directions that
+                 occur are calculated once with stepVector(...), and they are added up by
+                 walkSteps(...) compiled by Numba. The positions are exactly the same as those of
+                 makeCurve(...) when the angle is a multiple of 90 degrees, and otherwise differ
+                 at most in the last bits.
+        '''
+        if backend == "python":
+            self.makeCurve(0, 1)
+            return
+        if backend == "numpy":
+            x, y = hilbertPoints(self.order)
+            along = stepVector(self.angle, self.size)
+            across = stepVector(self.angle - 90, self.size)
+            points = numpy.empty((len(x), 2))
+            for k in range(2):
+                numpy.multiply(x, along[k], out = points[:, k])
+                points[:, k] += y * across[k]
+                points[:, k] += self.position[k]
+            if len(self.lineList) > 0:
+                points = numpy.concatenate((numpy.reshape(self.lineList, (-1, 2)), points))
+            self.lineList = points
+            self.position = tuple(points[-1].tolist())
+            return
+        # The directions are between -order and order quarter turns from the start angle.
+        directions = curveDirections(self.order) + self.order
+        steps = numpy.array([stepVector(self.angle + 90 * i, self.size)
+                             for i in range(-self.order, self.order + 1)], dtype = numpy.float64)
+        points = numpy.empty((len(directions) + 1, 2))
+        compiledKernels["walkSteps"](directions, self.position, steps[:, 0], steps[:, 1], points)
+        self.lineList.extend(zip(points[:, 0].tolist(), points[:, 1].tolist()))
+        self.position = self.lineList[-1]
+
+    def iterPoints(self):
+        '''
+        Generator that yields the positions of the corners in the curve one at a time.
+
+        self: An object of the class Curve.
+        On exit: The position of every corner in the curve, starting at self.position, has been
+                 yielded as a tuple in the order of the curve. Every corner is calculated from
+                 its index with hilbertPointsAt(...) and placed as in makeLineList(), so only
+                 the index is kept between the corners and the memory used does not depend on
+                 the order. Neither self.position nor self.lineList is changed.
+        '''
+        along = stepVector(self.angle, self.size)
+        across = stepVector(self.angle - 90, self.size)
+        for index in range(4 ** self.order):
+            x, y = hilbertPointsAt(index, self.order)
+            yield (x * along[0] + y * across[0] + self.position[0],
+                   x * along[1] + y * across[1] + self.position[1])
+
+    def iterChunks(self, chunkSize = 65536):
+        '''
+        Generator that yields the positions of the corners in the curve a chunk at a time.
+
+        self: An object of the class Curve.
+        chunkSize: The highest number of corners in a chunk.
+        On exit: The positions of all corners in the curve, starting at self.position, have
+                 been yielded in the order of the curve as lists of at most chunkSize tuples,
+                 where every chunk continues where the one before ended. Unless backend is
+                 "python", the corners of a chunk are calculated from a range of indices at
+                 once by hilbertPointsAt(...), with the same transform as makeLineList(), and
+                 otherwise they are taken from iterPoints(). Only one chunk is in memory at a
+                 time, so curves of any order can be drawn or written with flat memory.
+        '''
+        count = 4 ** self.order
+        if backend == "python":
+            chunk = []
+            for point in self.iterPoints():
+                chunk.append(point)
+                if len(chunk) == chunkSize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+            return
+        along = stepVector(self.angle, self.size)
+        across = stepVector(self.angle - 90, self.size)
+        for start in range(0, count, chunkSize):
+            x, y = hilbertPointsAt(numpy.arange(start, min(start + chunkSize, count), dtype = numpy.int64),
+                                   self.order)
+            points = numpy.empty((len(x), 2))
+            for k in range(2):
+                numpy.multiply(x, along[k], out = points[:, k])
+                points[:, k] += y * across[k]
+                points[:, k] += self.position[k]
+            yield points.tolist()
 
     def drawCurve(self, draw):
         '''
@@ -190,43 +360,299 @@ class Curve:
         draw: Draw object.
         On exit: The curve has been drawn using the attributes of self and the
                  procedure drawLine(...). The colours of the curve change gradually
-                 from the beginning to the end of the curve.
+                 from the beginning to the end of the curve. If self.lineList is empty,
+                 the positions are taken from iterChunks() instead, once for every
+                 width of the line, so the curve is never stored as a whole.
         '''
+        lineList = self.lineList
+        if numpy is not None and isinstance(lineList, numpy.ndarray):
+            # Indexing a list is much faster than indexing an array one element at a time.
+            lineList = lineList.tolist()
+        count = len(lineList)
+        if count == 0:
+            count = 4 ** self.order
         colour1Step = []
         colour2Step = []
         # Calculate the gradiant step between every segment in the curve
         # for the line (colour1Step) and its edges(colour2Step).
         for i in range(3):
-            colour1Step.append((self.midColour[0][i] - self.endMidColour[0][i]) / float(len(self.lineList) - 1))
-            colour2Step.append((self.edgeColour[0][i] - self.endEdgeColour[0][i]) / float(len(self.lineList) - 1))
+            colour1Step.append((self.midColour[0][i] - self.endMidColour[0][i]) / float(count - 1))
+            colour2Step.append((self.edgeColour[0][i] - self.endEdgeColour[0][i]) / float(count - 1))
         for i in range(0, self.thickness, 2):
-            for j in range(1, len(self.lineList)):
-                colour1 = []
-                colour2 = []
-                colourStep = []
-                for k in range(3):
-                    # Calculate the colour of the line and its edges at the segment j.
-                    colour1.append(self.midColour[0][k] - colour1Step[k] * j)
-                    colour2.append(self.edgeColour[0][k] - colour2Step[k] * j)
-                    # Gradiant step for the line.
-                    colourStep.append((colour1[k] - colour2[k]) / self.thickness)
-                drawLine(draw, (int(self.lineList[j - 1][0]), int(self.lineList[j - 1][1])),
-                        (int(self.lineList[j][0]), int(self.lineList[j][1])), self.thickness - i,
-                         [int(colour2[k] + (i + 1) * colourStep[k]) for k in range(3)])
-
-    def makeImage(self):
+            chunks = [lineList]
+            if len(lineList) == 0:
+                chunks = self.iterChunks()
+            j = 0
+            previous = None
+            for chunk in chunks:
+                for point in chunk:
+                    if previous is None:
+                        previous = point
+                        continue
+                    j = j + 1
+                    colour1 = []
+                    colour2 = []
+                    colourStep = []
+                    for k in range(3):
+                        # Calculate the colour of the line and its edges at the segment j.
+                        colour1.append(self.midColour[0][k] - colour1Step[k] * j)
+                        colour2.append(self.edgeColour[0][k] - colour2Step[k] * j)
+                        # Gradiant step for the line.
+                        colourStep.append((colour1[k] - colour2[k]) / self.thickness)
+                    drawLine(draw, (int(previous[0]), int(previous[1])),
+                            (int(point[0]), int(point[1])), self.thickness - i,
+                             [int(colour2[k] + (i + 1) * colourStep[k]) for k in range(3)])
+                    previous = point
+
+    def drawCurveField(self, img):
+        '''
+        Draws a Hilbert curve in one pass from the distance of every pixel to the curve.
+
+        self: An object of the class Curve.
+        img: The RGB image the curve is drawn on.
+        On exit: The curve has been drawn with the same colours as drawCurve(...), but instead
+                 of drawing every segment once for every width of the line, the segments of a
+                 chunk from iterChunks() are compared with the pixels around them at once by
+                 strokeKeys(...), or strokeKeysLoop(...) compiled by Numba for the backend
+                 "numba". For every pixel this gives the narrowest line that covers it,
+                 i.e. how far it is from the middle of the line, and the last segment that does,
+                 i.e. how far along the curve it is, and the colour for both is calculated in
+                 one step for the whole image. The result only differs from drawCurve(...) on
+                 the edges of the lines, where ImageDraw rounds the corners of wide lines in its
+                 own way. Requires NumPy. makeImage(...) only uses it for the backend "numba",
+                 since with NumPy alone the arrays of keys and distances take more memory than
+                 drawCurve(...) and are not faster for most curves.
+        '''
+        count = 4 ** self.order
+        width, height = img.size
+        keyType = numpy.int64
+        if count * ((self.thickness + 1) // 2) < 2 ** 31:
+            keyType = numpy.int32
+        keys = numpy.full(width * height, -1, dtype = keyType)
+        first = 0
+        previous = None
+        for chunk in self.iterChunks():
+            points = numpy.trunc(numpy.array(chunk, dtype = numpy.float64))
+            if previous is not None:
+                points = numpy.concatenate((previous, points))
+            if backend == "numba":
+                compiledKernels["strokeKeysLoop"](keys, width, height, points[:-1], points[1:], first,
+                                                  self.thickness, count)
+            else:
+                strokeKeys(keys, (width, height), points[:-1], points[1:], first, self.thickness, count)
+            first = first + len(points) - 1
+            previous = points[-1:]
+        self.paintKeys(img, keys, count)
+
+    def drawCurveDoubling(self, img):
+        '''
+        Draws a Hilbert curve from copies of the curve of one order lower.
+
+        self: An object of the class Curve. self.angle must be a multiple of 90 degrees.
+        img: The RGB image the curve is drawn on.
+        On exit: The curve has been drawn with the same colours as drawCurveField(...). The pass
+                 and the segment of every pixel have been found for a single corner, and for
+                 every order after that from four transposed, flipped or moved copies of the
+                 order below by doubleKeys(...), so only the three segments joining the copies
+                 are drawn. The keys of the curve are kept in self.raster, and a curve with the
+                 same segment length and thickness starts from them if its order is not lower.
+                 With an even thickness the image is the same as with drawCurve(...). With an
+                 odd thickness the ends of the lines in the copies turned half a turn may be a
+                 pixel off, since ImageDraw rounds them down. Requires NumPy.
+        '''
+        scale = 2 ** 40 # More than the number of segments in any curve that fits in memory.
+        along = stepVector(self.angle, self.size)
+        across = stepVector(self.angle - 90, self.size)
+        step = abs(along[0] + along[1])
+        margin = self.thickness // 2 + 2
+        # When the segments start out along the rows of the image the keys are built
+        # flipped, see doubleKeys(...), so at most they have to be turned half a turn.
+        flipped = along[0] != 0
+        order = 0
+        keys = numpy.full((2 * margin + 1, 2 * margin + 1), -1, dtype = numpy.int64)
+        if self.raster is not None and self.raster[:3] == (step, self.thickness, flipped) and \
+           self.raster[3] <= self.order:
+            order, keys = self.raster[3:]
+        while order < self.order:
+            keys = doubleKeys(keys, order, step, margin, self.thickness, scale, flipped)
+            order = order + 1
+        self.raster = (step, self.thickness, flipped, order, keys)
+        # Turn the keys to follow the segments on the image and find the first corner in them.
+        side = keys.shape[0]
+        if flipped:
+            firstRow = side - 1 - margin
+            firstColumn = margin
+            turn = along[0] < 0
+        else:
+            keys = keys.T
+            firstRow = margin
+            firstColumn = margin
+            turn = along[1] < 0
+        if turn:
+            keys = keys[::-1, ::-1]
+            firstRow = side - 1 - firstRow
+            firstColumn = side - 1 - firstColumn
+        top = int(self.position[1]) - firstRow
+        left = int(self.position[0]) - firstColumn
+        width, height = img.size
+        imageKeys = numpy.full((height, width), -1, dtype = numpy.int64)
+        imageKeys[max(top, 0):top + side, max(left, 0):left + side] = \
+            keys[max(-top, 0):height - top, max(-left, 0):width - left]
+        self.paintKeys(img, imageKeys.reshape(width * height), scale)
+
+    def doublingFaster(self):
+        '''
+        Tells whether drawCurveDoubling(...) is expected to draw the curve faster than drawCurve(...).
+
+        self: An object of the class Curve.
+        On exit: True has been returned if NumPy can be used, self.angle is a multiple of 90
+                 degrees and drawCurve(...) would draw more than one line for every 128 pixels
+                 of the image, counting every pass, and False otherwise. drawCurveDoubling(...)
+                 takes time in proportion to the pixels, drawCurve(...) to the lines, so it
+                 only wins for a high order and a thin line.
+        '''
+        if backend == "python" or self.angle % 90 != 0:
+            return False
+        imageSize = (2 ** self.order + 1) * self.size
+        return 4 ** self.order * ((self.thickness + 1) // 2) * 128 > imageSize * imageSize
+
+    def paintKeys(self, img, keys, scale):
+        '''
+        Colours the pixels of an image from the pass and the segment that cover them.
+
+        self: An object of the class Curve.
+        img: The RGB image the curve is drawn on.
+        keys: A NumPy integer array with one value per pixel of the image, row by row, which is
+              the pass of drawCurve(...) times scale plus the segment, or -1 for the background.
+        scale: A number larger than the number of segments in the curve.
+        On exit: Every pixel with a key has been given the colour drawCurve(...) uses for its
+                 pass and segment by segmentColours(...), calculated for every pass and
+                 segment once if there are fewer of those than pixels to colour, and
+                 otherwise for the pixels themselves. The keys are handled 2 ** 18 at a time,
+                 so the memory needed besides the image does not grow with its size.
+        '''
+        count = 4 ** self.order
+        passes = (self.thickness + 1) // 2
+        width, height = img.size
+        pixels = numpy.array(img).reshape(width * height, 3)
+        table = None
+        if passes * count < numpy.count_nonzero(keys >= 0):
+            table = self.segmentColours(*numpy.divmod(numpy.arange(passes * count), count))
+        for start in range(0, width * height, 2 ** 18):
+            part = keys[start:start + 2 ** 18]
+            covered = part >= 0
+            part = part[covered]
+            passNumbers = part // scale
+            j = part - passNumbers * scale
+            if table is None:
+                colours = self.segmentColours(passNumbers, j)
+            else:
+                colours = table[passNumbers * count + j]
+            pixels[start:start + 2 ** 18][covered] = colours
+        img.paste(Image.fromarray(pixels.reshape(height, width, 3)))
+
+    def segmentColours(self, passNumbers, j):
+        '''
+        Calculates the colours drawCurve(...) uses for the given passes and segments.
+
+        self: An object of the class Curve.
+        passNumbers: A NumPy integer array with the passes, 0 for the widest line.
+        j: A NumPy integer array with the segments, counted from 1.
+        On exit: A NumPy array of shape (n, 3) with the RGB colour of every pass and segment
+                 has been returned, calculated exactly as by drawCurve(...).
+        '''
+        count = 4 ** self.order
+        # i is the width removed from the line before the pass.
+        i = 2 * passNumbers
+        colours = numpy.empty((len(j), 3))
+        for k in range(3):
+            colour1Step = (self.midColour[0][k] - self.endMidColour[0][k]) / float(count - 1)
+            colour2Step = (self.edgeColour[0][k] - self.endEdgeColour[0][k]) / float(count - 1)
+            colour1 = self.midColour[0][k] - colour1Step * j
+            colour2 = self.edgeColour[0][k] - colour2Step * j
+            colours[:, k] = colour2 + (i + 1) * ((colour1 - colour2) / self.thickness)
+        return colours.astype(numpy.uint8)
+
+    def exportPoints(self, fileName, chunkSize = 65536):
+        '''
+        Writes the positions of the corners in the curve to a text file.
+
+        self: An object of the class Curve.
+        fileName: The name of the file.
+        chunkSize: See iterChunks(...).
+        On exit: The x and y coordinates of every corner, starting at self.position, have been
+                 written to the file as one line of comma separated values per corner, in the
+                 order of the curve. The corners are taken from iterChunks(...) and written
+                 one chunk at a time, so the memory used does not depend on the order.
+        '''
+        pointFile = open(fileName, "w")
+        for chunk in self.iterChunks(chunkSize):
+            pointFile.write("".join("%r,%r\n" % (x, y) for x, y in chunk))
+        pointFile.close()
+
+    def makeImage(self, distanceField = False, pixelSize = None, supersample = 1, doubling = False,
+                  keepRaster = False):
         '''
         Creates an image with a Hilbert curve.
 
         self: An object of the class Curve.
+        distanceField: A boolean variable determining whether the curve should be drawn in one
+                       pass with drawCurveField(...). It is only used with the backend
+                       "numba"; with NumPy alone drawCurveField(...) needs more memory than
+                       drawCurve(...) and is not faster for most curves, so drawCurve(...) is
+                       used instead.
+        pixelSize: The width and height of the image in pixels, or None for an image where
+                   every segment is self.size pixels long.
+        supersample: How many pixels in each direction the curve is drawn with for every pixel
+                     in the image when pixelSize is given. With the default 1 the curve is drawn
+                     at the size of the image. A larger value gives a smoother small image,
+                     such as a thumbnail, but draws supersample ** 2 times as many pixels.
+        doubling: A boolean variable determining whether the curve should be drawn with
+                  drawCurveDoubling(...) when self.angle is a multiple of 90 degrees. For other
+                  angles it is ignored. If None, it is chosen by doublingFaster(). Requires
+                  NumPy.
+        keepRaster: A boolean variable determining whether the keys built by
+                    drawCurveDoubling(...) should be kept in self.raster, so that the next curve
+                    with the same segment length and thickness starts from them. By default
+                    self.raster is set to None once the image has been drawn, since the keys
+                    take 8 bytes for every pixel of the image.
         On exit: An image has been created to fit the rotation and the size of
-                 the curve. The curve has been drawn on the image using drawCurve(...).
+                 the curve. The curve has been drawn on the image using drawCurve(...),
+                 drawCurveField(...) if distanceField or drawCurveDoubling(...) if doubling,
+                 and self.position is the start of the curve. For drawCurve(...) the corners
+                 of a curve with at most 65536 of them are created once by makeLineList()
+                 and kept in self.lineList, and for a larger curve self.lineList is left
+                 empty and they are taken from iterChunks() one chunk at a time. If
+                 pixelSize is given, the segments and the thickness of the line have been
+                 scaled to whole pixels, an even number of them for the thickness, so that
+                 the curve is drawn directly at about supersample times pixelSize, and the
+                 image has been resized to pixelSize with antialiasing if it differs.
+                 self.size and self.thickness are unchanged afterwards.
         '''
         sideLength = (2 ** (self.order) - 1) * self.size #Length of one side of the rectangle filled by the curve.
         gap = self.size # Space added around the curve.
         cosine = math.cos(math.radians(self.angle % 90))
         sine = math.sin(math.radians(self.angle % 90))
         imageSize = int(math.ceil((cosine + sine) * sideLength + 2 * self.size))
+        if pixelSize is not None:
+            # Scale the curve to the resolution it is drawn with instead of resizing afterwards.
+            # The segments are kept whole pixels long, since stepVector(...) truncates them for
+            # an unrotated curve, and the small difference is taken up by the final resize.
+            factor = supersample * pixelSize / ((cosine + sine) * sideLength + 2 * self.size)
+            size = self.size
+            thickness = self.thickness
+            self.size = max(int(round(size * factor)), 1)
+            factor = self.size / float(size)
+            # An even thickness keeps the lines the same when drawCurveDoubling(...) turns them.
+            self.thickness = max(int(round(thickness * factor / 2.0)) * 2, 2)
+            try:
+                img = self.makeImage(distanceField, doubling = doubling, keepRaster = keepRaster)
+            finally:
+                self.size = size
+                self.thickness = thickness
+            if img.size != (pixelSize, pixelSize):
+                img = img.resize((pixelSize, pixelSize), Image.ANTIALIAS)
+            return img
         img = Image.new("RGB", (imageSize, imageSize), self.background[0])
         # Change the start position for the curve so that the curve will fit in the picture.
         if self.angle < 90:
@@ -243,9 +669,22 @@ class Curve:
             y = cosine + sine
         self.position = (gap + x * sideLength, gap + y * sideLength)
         self.lineList = []
-        draw = ImageDraw.Draw(img)
-        self.makeCurve(0, 1)
-        self.drawCurve(draw)
+        if doubling is None:
+            doubling = self.doublingFaster()
+        if doubling and self.angle % 90 == 0:
+            self.drawCurveDoubling(img)
+        elif distanceField and backend == "numba":
+            self.drawCurveField(img)
+        else:
+            if 4 ** self.order <= 65536:
+                # A curve that fits in one chunk is created once and reused for every pass.
+                start = self.position
+                self.makeLineList()
+                self.position = start
+            draw = ImageDraw.Draw(img)
+            self.drawCurve(draw)
+        if not keepRaster:
+            self.raster = None
         return img
         
 def drawLine(draw, startPoint, endPoint, lineWidth, colour):
@@ -272,6 +711,389 @@ def drawLine(draw, startPoint, endPoint, lineWidth, colour):
                endPoint[1] + changey),
               fill = (colour[0], colour[1], colour[2]), width = lineWidth)
 
+def strokeKeys(keys, size, starts, ends, first, thickness, count):
+    '''
+    Finds which pass of Curve.drawCurve(...) and which segment colour the pixels around segments.
+
+    keys: A NumPy integer array with one value per pixel of the image, row by row, -1 where no
+          segment has been found yet.
+    size: A tuple with the width and the height of the image.
+    starts, ends: Arrays of shape (n, 2) with the whole pixel corners at the start and the end
+                  of the segments.
+    first: The index of the first of the segments in the curve.
+    thickness: The width of the line.
+    count: The number of corners in the curve.
+    On exit: Every pixel that a line of width thickness along a segment covers, with the
+             square ends of drawLine(...), has been given the key pass * count + index, if that
+             is larger than its old key. Since drawCurve(...) draws the passes from the widest
+             to the narrowest and the segments in order, the largest key is the one drawn last.
+             The pass is the last one whose width, thickness - 2 * pass, covers the pixel. For
+             every pixel the narrowest width is found from its distance along and across the
+             segment, rounded the way ImageDraw rounds wide horizontal and vertical lines: the
+             ends of the line are truncated to whole pixels, and a line of even width reaches
+             one pixel further on one side. The segments that run mostly along x and those that
+             run mostly along y are handled separately, in batches of about 2 ** 18 pixels with
+             the distances in float32, so the boxes around them fit tightly and the temporary
+             arrays stay small.
+    '''
+    width, height = size
+    reach = thickness / 2.0
+    passes = (thickness + 1) // 2
+    vectors = ends - starts
+    lengths = numpy.hypot(vectors[:, 0], vectors[:, 1])
+    indices = first + 1 + numpy.arange(len(starts))
+    for horizontal in (True, False):
+        group = lengths > 0
+        if horizontal:
+            group &= numpy.abs(vectors[:, 0]) >= numpy.abs(vectors[:, 1])
+        else:
+            group &= numpy.abs(vectors[:, 0]) < numpy.abs(vectors[:, 1])
+        if not group.any():
+            continue
+        groupStarts = starts[group]
+        groupLengths = lengths[group]
+        groupIndices = indices[group]
+        directions = vectors[group] / groupLengths[:, None]
+        # The corners of the rectangle covered by the widest line along every segment.
+        normals = numpy.stack((-directions[:, 1], directions[:, 0]), 1) * reach
+        head = groupStarts - directions * reach
+        tail = groupStarts + directions * (groupLengths[:, None] + reach)
+        corners = numpy.stack((head + normals, head - normals, tail + normals, tail - normals))
+        low = (numpy.floor(corners.min(0)) - 1).astype(numpy.int64)
+        box = (numpy.ceil(corners.max(0)) + 2).astype(numpy.int64) - low
+        offsetx, offsety = numpy.meshgrid(numpy.arange(box[:, 0].max()), numpy.arange(box[:, 1].max()))
+        batch = max(2 ** 18 // offsetx.size, 1)
+        # The offsets from the start of a segment are whole pixels, which float32 holds exactly.
+        offsets = (low - groupStarts).astype(numpy.float32)
+        directions = directions.astype(numpy.float32)
+        # A width w covers a pixel if w >= sign * along - toEnd and w > -sign * along - fromEnd,
+        # and the side of the line decides whether across is compared with >= or >. Whether the
+        # segment points along +x or +y decides which end is measured from its length.
+        forward = (directions[:, 0] + directions[:, 1]) > 0
+        sign = numpy.where(forward, 2, -2).astype(numpy.float32)
+        toEnd = numpy.where(forward, 2 * groupLengths, 0).astype(numpy.float32)
+        fromEnd = numpy.where(forward, 0, 2 * groupLengths).astype(numpy.float32) + 2
+        acrossSign = numpy.float32(2 if horizontal else -2)
+        floatx = offsetx.astype(numpy.float32)
+        floaty = offsety.astype(numpy.float32)
+        for start in range(0, len(groupStarts), batch):
+            part = slice(start, start + batch)
+            dx = offsets[part, 0, None, None] + floatx
+            dy = offsets[part, 1, None, None] + floaty
+            directionx = directions[part, 0, None, None]
+            directiony = directions[part, 1, None, None]
+            along = dx * directionx
+            along += dy * directiony
+            across = dy * directionx
+            across -= dx * directiony
+            across *= acrossSign
+            along *= sign[part, None, None]
+            needed = along - toEnd[part, None, None]
+            numpy.maximum(needed, across, out = needed)
+            numpy.ceil(needed, out = needed)
+            # The bound w must be above, negated so that the array along can be reused.
+            along += fromEnd[part, None, None]
+            numpy.minimum(along, across, out = along)
+            numpy.negative(along, out = along)
+            numpy.floor(along, out = along)
+            along += 1
+            numpy.maximum(needed, along, out = needed)
+            passNumber = ((thickness - needed) // 2).astype(numpy.int32)
+            x = low[part, 0, None, None] + offsetx
+            y = low[part, 1, None, None] + offsety
+            inside = (passNumber >= 0) & (x >= 0) & (x < width) & (y >= 0) & (y < height)
+            numpy.minimum(passNumber, passes - 1, out = passNumber)
+            segmentKeys = passNumber[inside] * numpy.int64(count) + numpy.broadcast_to(
+                groupIndices[part, None, None], inside.shape)[inside]
+            numpy.maximum.at(keys, (y * width + x)[inside], segmentKeys.astype(keys.dtype))
+
+def strokeKeysLoop(keys, width, height, starts, ends, first, thickness, count):
+    '''
+    Finds which pass of Curve.drawCurve(...) and which segment colour the pixels around
+    segments, one pixel at a time.
+
+    keys, starts, ends, first, thickness, count: See strokeKeys(...).
+    width, height: The size of the image.
+    On exit: keys has been updated exactly as by strokeKeys(...), visiting only the box around
+             each segment. The procedure only uses loops and arithmetic on scalars, so that
+             selectBackend(...) can compile it with Numba.
+    '''
+    reach = thickness / 2.0
+    passes = (thickness + 1) // 2
+    for n in range(starts.shape[0]):
+        startx = starts[n, 0]
+        starty = starts[n, 1]
+        vectorx = ends[n, 0] - startx
+        vectory = ends[n, 1] - starty
+        length = numpy.hypot(vectorx, vectory)
+        if length == 0:
+            continue
+        directionx = vectorx / length
+        directiony = vectory / length
+        horizontal = abs(vectorx) >= abs(vectory)
+        forward = directionx + directiony > 0
+        margin = (abs(directionx) + abs(directiony)) * reach
+        lowx = max(int(math.floor(min(startx, startx + vectorx) - margin)) - 1, 0)
+        highx = min(int(math.ceil(max(startx, startx + vectorx) + margin)) + 1, width - 1)
+        lowy = max(int(math.floor(min(starty, starty + vectory) - margin)) - 1, 0)
+        highy = min(int(math.ceil(max(starty, starty + vectory) + margin)) + 1, height - 1)
+        for y in range(lowy, highy + 1):
+            for x in range(lowx, highx + 1):
+                dx = x - startx
+                dy = y - starty
+                along = dx * directionx + dy * directiony
+                across = dy * directionx - dx * directiony
+                beyond = along - length
+                if forward:
+                    atLeast = 2 * beyond
+                    above = -2 * along - 2
+                else:
+                    atLeast = -2 * along
+                    above = 2 * beyond - 2
+                if horizontal:
+                    above = max(above, -2 * across)
+                    atLeast = max(atLeast, 2 * across)
+                else:
+                    atLeast = max(atLeast, -2 * across)
+                    above = max(above, 2 * across)
+                needed = max(math.ceil(atLeast), math.floor(above) + 1)
+                passNumber = (thickness - needed) // 2
+                if passNumber >= 0:
+                    key = int(min(passNumber, passes - 1)) * count + first + 1 + n
+                    if key > keys[y * width + x]:
+                        keys[y * width + x] = key
+
+def doubleKeys(keys, order, step, margin, thickness, scale, flipped = False):
+    '''
+    Builds the keys of the pixels around a Hilbert curve from the keys of the curve of one order lower.
+
+    keys: A square NumPy integer array with the pass of Curve.drawCurve(...) times scale plus
+          the segment for every pixel around a curve of the given order, or -1 where there is
+          no line. The rows follow the y axis and the columns the x axis of hilbertPoints(...),
+          the first corner is at (margin, margin) and the segments are step pixels long.
+          If flipped, the rows follow the y axis backwards and the first corner is at the
+          row margin from the bottom.
+    order: The order of the curve in keys.
+    step: The length of the segments in pixels.
+    margin: The number of pixels around the corners of the curve, at least half the thickness.
+    thickness: The width of the line.
+    scale: See Curve.paintKeys(...).
+    flipped: A boolean variable, see keys.
+    On exit: The keys for the curve of the order above have been returned in the same form.
+             The curve of the order above is made of the curve in keys transposed, moved up
+             once and moved up and to the right, and finally transposed and flipped both ways,
+             with the segments counted on from the copy before. ImageDraw draws wide lines
+             the same way when they are transposed or turned half a turn, but not when they
+             are flipped one way only, so the keys of a flipped curve are built flipped
+             instead of being flipped afterwards, and the two transposed copies swap places. The copies are combined so
+             that every pixel keeps the narrowest pass and the last segment covering it, and
+             only the three segments joining them are drawn, with strokeKeys(...), or
+             strokeKeysLoop(...) for the backend "numba".
+    '''
+    half = 2 ** order
+    count = 4 ** order
+    shift = half * step
+    side = keys.shape[0]
+    newSide = side + shift
+    newKeys = numpy.full((newSide, newSide), -1, dtype = numpy.int64)
+    copies = ((0, 0, keys.T),
+              (shift, 0, keys),
+              (shift, shift, keys),
+              (0, shift, keys[::-1, ::-1].T))
+    if flipped:
+        copies = ((shift, 0, keys[::-1, ::-1].T),
+                  (0, 0, keys),
+                  (0, shift, keys),
+                  (shift, shift, keys.T))
+    for number, (top, left, copy) in enumerate(copies):
+        region = newKeys[top:top + side, left:left + side]
+        numpy.maximum(region, numpy.where(copy >= 0, copy + number * count, -1), out = region)
+    # The segments joining the copies, as corners on the grid of hilbertPoints(...).
+    joins = (((0, half - 1), (0, half)),
+             ((half - 1, half), (half, half)),
+             ((2 * half - 1, half), (2 * half - 1, half - 1)))
+    flatKeys = newKeys.reshape(newSide * newSide)
+    for number, (start, end) in enumerate(joins):
+        if flipped:
+            start = (start[0], 2 * half - 1 - start[1])
+            end = (end[0], 2 * half - 1 - end[1])
+        starts = margin + step * numpy.array([start], dtype = numpy.float64)
+        ends = margin + step * numpy.array([end], dtype = numpy.float64)
+        first = (number + 1) * count - 1
+        if backend == "numba":
+            compiledKernels["strokeKeysLoop"](flatKeys, newSide, newSide, starts, ends, first, thickness, scale)
+        else:
+            strokeKeys(flatKeys, (newSide, newSide), starts, ends, first, thickness, scale)
+    return newKeys
+
+def stepVector(angle, size):
+    '''
+    Calculates how far the curve moves in one segment in the given direction.
+
+    angle: The direction of the segment in degrees.
+    size: The length of the segment.
+    On exit: A tuple with the change in x and y has been returned. If the angle is a multiple
+             of 90 degrees the values are truncated to integers, so that the corners of an
+             unrotated curve are whole pixels.
+    '''
+    if angle % 90 == 0:
+        return (int(math.cos(math.radians(angle))* size), int(math.sin(math.radians(angle))* size))
+    return (math.cos(math.radians(angle))* size, math.sin(math.radians(angle))* size)
+
+def hilbertPoints(order):
+    '''
+    Calculates the grid position of every corner in a Hilbert curve with NumPy array operations.
+
+    order: The order of the curve.
+    On exit: Two integer arrays with the x and y grid coordinates of the 4 ** order corners
+             have been returned, for a curve that starts at (0, 0), first moves along y and
+             ends at (2 ** order - 1, 0). This is the usual mapping from the index of a
+             corner to its position, but instead of taking the bits of every index apart the
+             quadrants are built from the curve of the order before, in place: the first
+             quadrant is that curve with x and y swapped, the second and the third are copies
+             moved up, and the right one, and the fourth is the first mirrored into the
+             lower right corner.
+    '''
+    count = 4 ** order
+    x = numpy.zeros(count, dtype = numpy.int32)
+    y = numpy.zeros(count, dtype = numpy.int32)
+    done = 1
+    for i in range(order):
+        half = 2 ** i
+        oldx = x[:done].copy()
+        oldy = y[:done].copy()
+        x[done:2 * done] = oldx
+        numpy.add(oldy, half, out = y[done:2 * done])
+        numpy.add(oldx, half, out = x[2 * done:3 * done])
+        numpy.add(oldy, half, out = y[2 * done:3 * done])
+        numpy.subtract(2 * half - 1, oldy, out = x[3 * done:4 * done])
+        numpy.subtract(half - 1, oldx, out = y[3 * done:4 * done])
+        x[:done] = oldy
+        y[:done] = oldx
+        done = 4 * done
+    return x, y
+
+def hilbertPointsAt(index, order):
+    '''
+    Calculates the grid position of the corners with the given indices in a Hilbert curve.
+
+    index: The index of a corner, or a NumPy integer array with the indices of many corners.
+    order: The order of the curve.
+    On exit: The x and y grid coordinates of the corners have been returned, in the same
+             layout as hilbertPoints(...). The two bits of the index for every order give the
+             quadrant, and the position found so far is mirrored and swapped by arithmetic
+             instead of by branches, so the same code works for one index and for arrays,
+             using memory only for the indices given.
+    '''
+    x = 0 * index
+    y = 0 * index
+    side = 1
+    for i in range(order):
+        rx = (index >> (2 * i + 1)) & 1
+        ry = ((index >> (2 * i)) ^ rx) & 1
+        # In the lower quadrants the curve is turned, and in the lower right one mirrored.
+        turn = 1 - ry
+        flip = turn * rx
+        x, y = x + flip * (side - 1 - 2 * x), y + flip * (side - 1 - 2 * y)
+        x, y = x + turn * (y - x), y + turn * (x - y)
+        x = x + side * rx
+        y = y + side * ry
+        side = 2 * side
+    return x, y
+
+def curveDirections(order):
+    '''
+    Calculates the direction of every segment in a Hilbert curve with NumPy array operations.
+
+    order: The order of the curve.
+    On exit: An integer array with the 4 ** order - 1 directions of the segments that
+             Curve.makeCurve(0, 1) would walk has been returned, as the number of quarter
+             turns from the start angle. Since the curve with factor -1 is the mirror image of
+             the one with factor 1, a curve of order n is made from the directions d of the
+             curve of order n - 1 as -d - 1, a step at -1, d, a step at 0, d, a step at 1
+             and -d + 1, one order at a time without recursion.
+    '''
+    directions = numpy.zeros(0, dtype = numpy.int64)
+    for i in range(order):
+        directions = numpy.concatenate((-directions - 1, [-1], directions, [0],
+                                        directions, [1], 1 - directions))
+    return directions
+
+def walkSteps(directions, first, stepsx, stepsy, points):
+    '''
+    Adds up the segments of a curve one at a time.
+
+    directions: An integer array with the index of the segment in stepsx and stepsy for every
+                step of the curve.
+    first: A tuple with the position the curve starts at.
+    stepsx, stepsy: Arrays with the change in x and y for every direction.
+    points: An array of shape (len(directions) + 1, 2) that the positions are written to.
+    On exit: The start position and the position after every step have been written to
+             points. The procedure only uses loops and arithmetic on scalars, so that
+             selectBackend(...) can compile it with Numba.
+    '''
+    x = first[0]
+    y = first[1]
+    points[0, 0] = x
+    points[0, 1] = y
+    for i in range(directions.shape[0]):
+        x = x + stepsx[directions[i]]
+        y = y + stepsy[directions[i]]
+        points[i + 1, 0] = x
+        points[i + 1, 1] = y
+
+def fastestBackend():
+    '''
+    Finds the fastest backend that can be imported.
+
+    On exit: "numba" has been returned if Numba is installed, otherwise "numpy" if NumPy is
+             installed, and otherwise "python".
+    '''
+    if numba is not None:
+        return "numba"
+    if numpy is not None:
+        return "numpy"
+    return "python"
+
+def selectBackend(name = None):
+    '''
+    Chooses the implementation used for creating the corners of the curve.
+
+    name: One of "python", "numpy" and "numba", or None. With None the environment variable
+          HILBERT_BACKEND is used if it is set, and otherwise fastestBackend(). When the module
+          is imported an unusable HILBERT_BACKEND only gives a warning, and fastestBackend()
+          is used instead.
+    On exit: The global variable backend has been set to the name of the backend, which is
+             returned, see Curve.makeLineList(). With "python" the curve is created by the
+             recursive Curve.makeCurve(...), which needs no other modules. For "numba",
+             walkSteps(...) and strokeKeysLoop(...) have been compiled and stored in
+             compiledKernels. A ValueError has been raised if the backend is unknown or cannot
+             be imported.
+    '''
+    global backend
+    if name is None:
+        name = os.environ.get("HILBERT_BACKEND")
+    if name is None:
+        name = fastestBackend()
+    if name not in ("python", "numpy", "numba"):
+        raise ValueError("Unknown backend %r, use python, numpy or numba" % name)
+    if (name == "numpy" and numpy is None) or (name == "numba" and numba is None):
+        raise ValueError("The %s backend needs the module %s, which is not installed" % (name, name))
+    if name == "numba" and "walkSteps" not in compiledKernels:
+        compiledKernels["walkSteps"] = numba.njit(cache = True)(walkSteps)
+        compiledKernels["strokeKeysLoop"] = numba.njit(cache = True)(strokeKeysLoop)
+    backend = name
+    return backend
+
+compiledKernels = {}
+try:
+    backend = selectBackend()
+except ValueError as error:
+    # A misspelled or missing backend in HILBERT_BACKEND must not stop the program from starting.
+    warnings.warn("%s. HILBERT_BACKEND is ignored and the %s backend is used instead." %
+                  (error, fastestBackend()))
+    backend = selectBackend(fastestBackend())
+
 #############################################################################################
 #
 # GUI creation starts here.
@@ -334,8 +1156,8 @@ def makeGUI():
     thicknessLabel.grid(row = 7, column = 2)
 
     # Create a thumbnail image.
-    img = line.makeImage()
-    tkImg = convertToPhotoimage(line.background, img.resize((250,250), Image.ANTIALIAS))
+    img = line.makeImage(pixelSize = 250, supersample = 4)
+    tkImg = convertToPhotoimage(line.background, img)
     thumbnail = Tk.Label(root, image = tkImg) 
     thumbnail.grid(row = 0, column = 2, rowspan = 7)
     
@@ -348,8 +1170,8 @@ def makeGUI():
                  image displayed in the thumbnail Label has been replaced with the new
                  image. 
         '''
-        img = line.makeImage()
-        tkImg = convertToPhotoimage(line.background, img.resize((250, 250), Image.ANTIALIAS))
+        img = line.makeImage(pixelSize = 250, supersample = 4)
+        tkImg = convertToPhotoimage(line.background, img)
         thumbnail.configure(image = tkImg)
         thumbnail.image = tkImg
 
@@ -566,15 +1388,12 @@ def makeGUI():
             '''
             Creates a new image of the specified size and saves it.
 
-            On exit: A new image has been created and saved using makeImage(...).
+            On exit: A new image has been created at the specified size and saved using
+                     makeImage(...). The attributes of the object line are unchanged.
                      The save_ window has been destroyed.
             '''
             size = int(sizeVar.get())
-            oldLineSize = line.size
-            line.size = math.ceil(float(size)/(2**(line.order)))
-            line.thickness = int(line.thickness * line.size /(2 * oldLineSize))*2
-            img = line.makeImage()
-            img = img.resize((int(sizeVar.get()),int(sizeVar.get())), Image.ANTIALIAS)
+            img = line.makeImage(pixelSize = size, doubling = None)
             img.save(nameVar.get() + formatVariable.get())
             save_.destroy()
                 
@@ -3,6 +3,17 @@ import random, math
 import Tkinter as Tk
 import tkColorChooser
 import time
+import collections, copy, itertools, operator
+import os, struct, warnings, zlib
+import multiprocessing
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import numba
+except ImportError:
+    numba = None
 
 '''
 A list of all the classes, methods and procedures used in the program:
@@ -19,9 +30,156 @@ class Square:
     def drawSquare(self, draw, outlineColour, fillColour):
         Draws the given square.
 
+    def leftChild(self, leftAngle, rightAngle):
+        Creates the left child of the square.
+
+    def rightChild(self, leftAngle, rightAngle):
+        Creates the right child of the square.
+
     def makeTree(self, leftAngle, rightAngle, order, listOfSquares):
         Recursive procedure that creates all the squares for a tree of the given order.
 
+    def iterTree(self, leftAngle, rightAngle, order, level = None):
+        Generator that yields the squares of a tree of the given order one at a time.
+
+class TreeGeometry:
+    A TreeGeometry object stores the squares of a pythagorean tree as NumPy arrays, one level at a time.
+
+    def __init__(self, rootCorners, leftAngle, rightAngle):
+        Initiates a TreeGeometry object containing only the root square.
+
+    def setAngles(self, leftAngle, rightAngle):
+        Changes the angles of the tree and calculates its levels again, reusing their arrays.
+
+    def addLevel(self):
+        Creates every square of the next level from the current leaves in one batched operation.
+
+    def grow(self, order):
+        Adds levels until the tree has the given order.
+
+    def growParallel(self, order, workers, splitLevel = None):
+        Adds levels until the tree has the given order, using a pool of processes.
+
+    def flatten(self):
+        Returns the corners, orders and angles of all squares as contiguous arrays.
+
+    def truncated(self, order):
+        Returns a TreeGeometry object with the first levels of the tree.
+
+    def toSquares(self):
+        Creates a list of Square objects from the stored arrays.
+
+    def makeIndex(self):
+        Returns a SquareIndex object for the squares, creating it the first time.
+
+class SquareIndex:
+    A SquareIndex object is a bounding volume hierarchy over the squares of a TreeGeometry object.
+
+    def __init__(self, geometry):
+        Initiates a SquareIndex object by calculating the bounding boxes of all subtrees.
+
+    def query(self, box, minSide = 0):
+        Finds the squares that intersect a rectangle.
+
+    def pick(self, point):
+        Finds the square that is drawn on top at a point.
+
+class GeometryCache:
+    A GeometryCache object keeps the most recently used tree shapes in unit coordinates.
+
+    def __init__(self, maxSquares):
+        Initiates an empty GeometryCache object.
+
+    def get(self, order, leftAngle, rightAngle, workers = 1, splitLevel = None):
+        Returns the TreeGeometry object for the given shape, creating it if needed.
+
+class GeometryStore:
+    A GeometryStore object keeps tree shapes in geometry files in a directory.
+
+    def __init__(self, directory, maxBytes, minOrder = 16):
+        Initiates a GeometryStore object.
+
+    def fileName(self, order, leftAngle, rightAngle):
+        Returns the name of the geometry file for the given shape.
+
+    def load(self, order, leftAngle, rightAngle):
+        Opens the stored geometry file for the given shape, if there is one.
+
+    def save(self, geometry):
+        Writes a shape to the store and removes the least recently used files.
+
+class PNGWriter:
+    A PNGWriter object writes a PNG file a few rows at a time.
+
+    def __init__(self, fileName, size, palette = None, level = 6, frames = None):
+        Opens the file and writes the header of the PNG file.
+
+    def chunk(self, kind, data):
+        Writes one chunk of the PNG file.
+
+    def writeRows(self, rows):
+        Compresses a number of rows of pixels and writes them to the file.
+
+    def writeFrame(self, rows, delay):
+        Compresses one frame of an animation and writes it to the file.
+
+    def close(self):
+        Writes the end of the PNG file and closes it.
+
+class SVGWriter:
+    An SVGWriter object writes the squares of a tree to an SVG file as they are found.
+
+    def __init__(self, fileName, size, background, unit):
+        Opens the file and writes the header of the SVG file.
+
+    def beginLevel(self, fillColour, outlineColour):
+        Starts the group of one level of the tree.
+
+    def writeSquares(self, points):
+        Writes a number of squares as one path.
+
+    def endLevel(self):
+        Ends the group of one level of the tree.
+
+    def close(self):
+        Writes the end of the SVG file and closes it.
+
+class PDFWriter:
+    A PDFWriter object writes the squares of a tree to a one page PDF file as they are found.
+
+    def __init__(self, fileName, size, background, unit):
+        Opens the file and writes the header and the page of the PDF file.
+
+    def writeObject(self, text):
+        Writes an object that is not a stream.
+
+    def write(self, text):
+        Adds text to the content stream.
+
+    def colour(self, colour):
+        Converts an RGB colour to the operands of a PDF colour operator.
+
+    def beginLevel(self, fillColour, outlineColour):
+        Sets the colours of one level of the tree.
+
+    def writeSquares(self, points):
+        Writes a number of squares as one path.
+
+    def endLevel(self):
+        Ends one level of the tree.
+
+    def close(self):
+        Writes the end of the PDF file and closes it.
+
+class FrameRenderer:
+    A FrameRenderer object draws the frames of an animation of a tree.
+
+    def __init__(self, tree, size):
+        Initiates a FrameRenderer object.
+
+    def render(self, settings):
+        Draws one frame of the animation.
+
 class Tree:
     Class representing a pythagorean tree.
 
@@ -31,12 +189,132 @@ class Tree:
     def firstSquare(self, size):
         Initiates the root Square object of the tree.
 
-    def drawTree(self, size, save = False, name = "pythagorasTree"):
+    def makeGeometry(self, size):
+        Creates a TreeGeometry object with all the squares of the tree.
+
+    def unitGeometry(self):
+        Returns the shape of the tree in unit coordinates from geometryCache.
+
+    def placement(self, size):
+        Calculates the affine transform from unit coordinates to the image.
+
+    def pickSquare(self, size, point):
+        Finds the square that is drawn on top at a point in the image.
+
+    def squaresInBox(self, size, box):
+        Finds the squares that intersect a rectangle in the image.
+
+    def squareAt(self, path, size):
+        Calculates the square reached by a path of left and right turns without creating the tree.
+
+    def iterPaths(self, paths, size):
+        Generator that yields the squares reached by a sequence of paths.
+
+    def zoom(self, factor, size):
+        Scales the tree by the given factor around the centre of the image.
+
+    def fitToImage(self, size, margin = 2):
+        Sets the scale and the offset so that the whole tree fills the image.
+
+    def iterVisible(self, size, level, minSide = 1.0):
+        Generator that yields the visible squares of one level of the tree.
+
+    def stampLevel(self, img, level, geometry, placement, fillColour, outlineColour, spriteError, sprites):
+        Draws one level of the tree by stamping sprites of the subtrees below the leaves of geometry.
+
+    def levelColours(self):
+        Calculates the fill colour of every level of the tree.
+
+    def paletteColours(self):
+        Creates the palette for images drawn with level indices.
+
+    def renderTree(self, size, colours, stream, cull, spriteDepth, spriteError, rasterize, antialias):
+        Creates an image with the given colours and draws the squares of the tree on it.
+
+    def drawTree(self, size, save = False, name = "pythagorasTree", stream = False, cull = False,
+                 spriteDepth = None, spriteError = 0.5, autoFit = False, rasterize = False,
+                 antialias = False, palette = False):
         Creates an image and draws a tree on it.
 
+    def drawTile(self, size, box, colours, minSide = 0, placement = None):
+        Draws the part of the tree that lies in a rectangle of the image.
+
+    def renderParallel(self, size, colours, workers, tileSize = 512):
+        Creates an image and draws the squares of the tree on it in tiles, using a pool of processes.
+
+    def exportTiled(self, size, fileName, tileSize = 1024, palette = True, minSide = 0, autoFit = False):
+        Saves a PNG image of the tree that is drawn and written one band of tiles at a time.
+
+    def exportPyramid(self, size, name, tileSize = 254, overlap = 1, fileFormat = "png", minSide = 1.0,
+                      resume = True, palette = True, autoFit = False):
+        Saves the image of the tree as a Deep Zoom image, a pyramid of tiles for viewing on the web.
+
+    def exportVector(self, size, fileName, minSide = 0, decimals = 1, autoFit = False):
+        Saves the tree as an SVG or a PDF file, writing the squares level by level as they are found.
+
+    def animate(self, size, timeline, fileName = None, pipe = None, delay = 40, workers = 1):
+        Draws a sequence of frames where the angles, the scale or the offset of the tree change.
+
 def matrixMultiplication(matrix1, matrix2):
     Multiplies two matrices.
 
+def subtreeRadii(leftAngle, rightAngle, depth):
+    Calculates how far the squares of a subtree can reach from the centre of its root square.
+
+def treeExtent(leftAngle, rightAngle, order):
+    Calculates the bounding box of a tree without creating its squares.
+
+def fillQuads(pixels, quads, colour, origin = (0, 0)):
+    Fills a batch of convex quadrilaterals in an image array, one span per row of each quadrilateral.
+
+def outlineQuads(pixels, quads, colour, origin = (0, 0)):
+    Draws the edges of a batch of quadrilaterals in an image array.
+
+def quadCoverage(quads, box, outline = False):
+    Calculates how much of every pixel in a rectangle is covered by a batch of squares.
+
+def blendCoverage(pixels, box, coverage, colour):
+    Blends a colour into a part of an image array in proportion to the coverage of every pixel.
+
+def saveGeometry(geometry, fileName, dtype = "float64"):
+    Writes a TreeGeometry object to a geometry file.
+
+def loadGeometry(fileName):
+    Opens a geometry file as a TreeGeometry object without reading the arrays into memory.
+
+def initGeometryWorker(buffers):
+    Stores the shared output arrays in a process of the pool used by TreeGeometry.growParallel(...).
+
+def growSubtrees(task):
+    Creates the deeper levels of a range of subtrees and writes them to the shared arrays.
+
+def initTileWorker(tree, size, colours, buffer):
+    Stores the tree and the shared image array in a process of the pool used by Tree.renderParallel(...).
+
+def drawSharedTile(box):
+    Draws one tile of the image in sharedTile.
+
+def initFrameWorker(tree, size):
+    Creates the FrameRenderer object of a process drawing the frames of Tree.animate(...).
+
+def renderSharedFrame(settings):
+    Draws one frame with the FrameRenderer object in sharedFrames.
+
+def interpolateTimeline(start, stop, frameCount):
+    Creates a timeline for Tree.animate(...) that changes settings evenly between two values.
+
+def childCorners(parents, leftRatio, rightRatio, leftTurn, rightTurn):
+    Calculates the corners of the children of a level of squares with NumPy array operations.
+
+def childCornersLoop(parents, leftRatio, rightRatio, leftCos, leftSin, rightCos, rightSin, children):
+    Calculates the corners of the children of a level of squares one square at a time.
+
+def fastestBackend():
+    Finds the fastest backend that can be imported.
+
+def selectBackend(name = None):
+    Chooses the implementation used for creating the squares of the tree.
+
 #############################################################################################
 
 A list of procedures and closures used for creating the GUI:
@@ -81,7 +359,7 @@ def createGUI():
         Updates the offset for the object tree based on how the mouse was moved.
 
     def scale(event):
-        Updates the scale of the object tree when pressing + or -.
+        Updates the scale of the object tree when pressing +, -, *, / or f.
 
     def pressUp(event):
         Decreases tree.positionChangey.
@@ -95,6 +373,9 @@ def createGUI():
     def pressLeft(event):
         Decreases tree.positionChangex.
 
+    def inspectSquare(event):
+        Shows information about the square that was right-clicked in the thumbnail image.
+
     def setFocus(event):
         Sets the focus to the widget that was clicked.
 
@@ -180,6 +461,46 @@ class Square:
         draw.polygon(self.corners[0] + self.corners[1] + self.corners[2] + self.corners[3],
                      outline = outlineColour, fill = fillColour)
 
+    def leftChild(self, leftAngle, rightAngle):
+        '''
+        Creates the left child of the square.
+
+        self: An object of the class Square.
+        leftAngle: The angle the left child of the square will be rotated relative
+                   to the rotation of the square.
+        rightAngle: The angle the right child of the square will be rotated relative
+                    to the rotation of the square.
+        On exit: A Square object has been created on top of the upper left corner of
+                 the square and rotated leftAngle degrees. The Square object is returned.
+        '''
+        leftSquareSide = self.side * math.sin(math.radians(rightAngle)) / math.sin(math.radians(180 - (leftAngle + rightAngle)))
+        leftSquare = Square([self.corners[3], (self.corners[3][0] + leftSquareSide, self.corners[3][1]),
+                             (self.corners[3][0] + leftSquareSide, self.corners[3][1] - leftSquareSide),
+                             (self.corners[3][0], self.corners[3][1] - leftSquareSide)], self.order + 1)
+        leftSquare.angle = self.angle + math.radians(-leftAngle)
+        leftSquare.rotateSquare(0, leftSquare.angle)
+        return leftSquare
+
+    def rightChild(self, leftAngle, rightAngle):
+        '''
+        Creates the right child of the square.
+
+        self: An object of the class Square.
+        leftAngle: The angle the left child of the square will be rotated relative
+                   to the rotation of the square.
+        rightAngle: The angle the right child of the square will be rotated relative
+                    to the rotation of the square.
+        On exit: A Square object has been created on top of the upper right corner of
+                 the square and rotated rightAngle degrees. The Square object is returned.
+        '''
+        rightSquareSide = self.side * math.sin(math.radians(leftAngle)) / math.sin(math.radians(180 - (leftAngle + rightAngle)))
+        rightSquare = Square([(self.corners[2][0] - rightSquareSide, self.corners[2][1]), self.corners[2],
+                             (self.corners[2][0], self.corners[2][1] - rightSquareSide),
+                             (self.corners[2][0] - rightSquareSide, self.corners[2][1] - rightSquareSide)], self.order + 1)
+        rightSquare.angle = self.angle + math.radians(rightAngle)
+        rightSquare.rotateSquare(1, rightSquare.angle)
+        return rightSquare
+
     def makeTree(self, leftAngle, rightAngle, order, listOfSquares):
         '''
         Recursive procedure that creates all the squares for a tree of the given order.
@@ -198,24 +519,970 @@ class Square:
         if self.order == order:
             return listOfSquares
         
-        leftSquareSide = self.side * math.sin(math.radians(rightAngle)) / math.sin(math.radians(180 - (leftAngle + rightAngle)))
-        leftSquare = Square([self.corners[3], (self.corners[3][0] + leftSquareSide, self.corners[3][1]),
-                             (self.corners[3][0] + leftSquareSide, self.corners[3][1] - leftSquareSide),
-                             (self.corners[3][0], self.corners[3][1] - leftSquareSide)], self.order + 1)
-        leftSquare.angle = self.angle + math.radians(-leftAngle)
-        leftSquare.rotateSquare(0, leftSquare.angle)
+        leftSquare = self.leftChild(leftAngle, rightAngle)
         listOfSquares.append(leftSquare)
         leftSquare.makeTree(leftAngle, rightAngle, order, listOfSquares)
         
-        rightSquareSide = self.side * math.sin(math.radians(leftAngle)) / math.sin(math.radians(180 - (leftAngle + rightAngle)))
-        rightSquare = Square([(self.corners[2][0] - rightSquareSide, self.corners[2][1]), self.corners[2],
-                             (self.corners[2][0], self.corners[2][1] - rightSquareSide),
-                             (self.corners[2][0] - rightSquareSide, self.corners[2][1] - rightSquareSide)], self.order + 1)
-        rightSquare.angle = self.angle + math.radians(rightAngle)
-        rightSquare.rotateSquare(1, rightSquare.angle)
+        rightSquare = self.rightChild(leftAngle, rightAngle)
         listOfSquares.append(rightSquare)
         rightSquare.makeTree(leftAngle, rightAngle, order, listOfSquares)
-        return listOfSquares            
+        return listOfSquares
+
+    def iterTree(self, leftAngle, rightAngle, order, level = None):
+        '''
+        Generator that yields the squares of a tree of the given order one at a time.
+
+        self: An object of the class Square. This is the root of the tree.
+        leftAngle: The angle the left child of a square will be rotated relative
+                   to the rotation of the square.
+        rightAngle: The angle the right child of a square will be rotated relative
+                    to the rotation of the square.
+        order: The order of the tree, in other words, the highest order a square in the tree
+               can have.
+        level: If given, only the squares with this order are yielded and no squares of a
+               higher order are created.
+        On exit: The square itself and the squares that makeTree(...) would have created have
+                 been yielded in the same depth-first order. Only the squares along the current
+                 path and their right siblings are kept in memory, so the memory used grows with
+                 the order of the tree and not with the number of squares.
+        '''
+        lowestLevel = level
+        if level is None:
+            lowestLevel = order
+        stack = [self]
+        while stack:
+            square = stack.pop()
+            if level is None or square.order == level:
+                yield square
+            if square.order < lowestLevel:
+                stack.append(square.rightChild(leftAngle, rightAngle))
+                stack.append(square.leftChild(leftAngle, rightAngle))
+
+class TreeGeometry:
+    '''
+    A TreeGeometry object stores the squares of a pythagorean tree as NumPy arrays, one level at a time.
+    Every level is created from the previous one in a single batched operation, and the squares of a
+    level are stored in the same order as makeTree(...) creates them, i.e. ordered by their path from
+    the root with left before right.
+
+    Attributes:
+        leftAngle: The angle the left child of a square is rotated relative to its parent.
+        rightAngle: The angle the right child of a square is rotated relative to its parent.
+        leftRatio: The side of a left child divided by the side of its parent.
+        rightRatio: The side of a right child divided by the side of its parent.
+        leftTurn: Tuple with the cosine and sine of the rotation from a square to its left child.
+        rightTurn: Tuple with the cosine and sine of the rotation from a square to its right child.
+        corners: A list with one array of shape (2 ** k, 4, 2) for every level k. The corners of
+                 each square are stored in the same order as in Square.corners.
+        angles: A list with one array of shape (2 ** k,) for every level k, containing the angle in
+                radians that each square is rotated.
+        sides: A list with one array of shape (2 ** k,) for every level k, containing the side of
+               each square.
+        order: The highest level that has been created so far.
+        squareIndexes: A dictionary with the SquareIndex objects returned by makeIndex(), with the
+                       order they were created for as keys. It is shared with the objects
+                       returned by truncated(...), since they contain the same levels.
+    '''
+    def __init__(self, rootCorners, leftAngle, rightAngle):
+        '''
+        Initiates a TreeGeometry object containing only the root square.
+
+        self: Object that is to be initiated.
+        rootCorners: A list with the four corners of the root square, see Square.corners.
+        leftAngle: See Attributes.
+        rightAngle: See Attributes.
+        On exit: A TreeGeometry object of order 0 has been initiated. The side ratios and the
+                 trigonometric values for the children have been calculated once for the angles
+                 with setAngles(...).
+        '''
+        root = numpy.array(rootCorners, dtype = numpy.float64).reshape(1, 4, 2)
+        self.corners = [root]
+        self.angles = [numpy.zeros(1)]
+        self.sides = [numpy.hypot(root[:, 1, 0] - root[:, 0, 0], root[:, 1, 1] - root[:, 0, 1])]
+        self.order = 0
+        self.squareIndexes = {}
+        self.setAngles(leftAngle, rightAngle)
+
+    def setAngles(self, leftAngle, rightAngle):
+        '''
+        Changes the angles of the tree and calculates its levels again, reusing their arrays.
+
+        self: An object of the class TreeGeometry.
+        leftAngle: See Attributes.
+        rightAngle: See Attributes.
+        On exit: The side ratios and the trigonometric values for the children have been
+                 calculated for the new angles. Every level above the root has been calculated
+                 again from the level below it and written into its existing arrays, since the
+                 number and the order of the squares do not depend on the angles, so no arrays
+                 are allocated for the levels. The SquareIndex objects have been discarded.
+                 The objects returned by truncated(...) share the arrays and change as well.
+        '''
+        self.leftAngle = leftAngle
+        self.rightAngle = rightAngle
+        base = math.sin(math.radians(180 - (leftAngle + rightAngle)))
+        self.leftRatio = math.sin(math.radians(rightAngle)) / base
+        self.rightRatio = math.sin(math.radians(leftAngle)) / base
+        self.leftTurn = (math.cos(math.radians(leftAngle)), math.sin(math.radians(leftAngle)))
+        self.rightTurn = (math.cos(math.radians(rightAngle)), math.sin(math.radians(rightAngle)))
+        self.squareIndexes.clear()
+        for i in range(1, self.order + 1):
+            parents = self.corners[i - 1]
+            count = len(parents)
+            children = self.corners[i].reshape(count, 2, 4, 2)
+            if backend == "numba":
+                compiledKernels["childCornersLoop"](parents, self.leftRatio, self.rightRatio,
+                                                    self.leftTurn[0], self.leftTurn[1],
+                                                    self.rightTurn[0], self.rightTurn[1], children)
+            else:
+                children[:] = childCorners(parents, self.leftRatio, self.rightRatio, self.leftTurn, self.rightTurn)
+            angles = self.angles[i].reshape(count, 2)
+            numpy.subtract(self.angles[i - 1], math.radians(leftAngle), out = angles[:, 0])
+            numpy.add(self.angles[i - 1], math.radians(rightAngle), out = angles[:, 1])
+            sides = self.sides[i].reshape(count, 2)
+            numpy.multiply(self.sides[i - 1], self.leftRatio, out = sides[:, 0])
+            numpy.multiply(self.sides[i - 1], self.rightRatio, out = sides[:, 1])
+
+    def addLevel(self):
+        '''
+        Creates every square of the next level from the current leaves in one batched operation.
+
+        self: An object of the class TreeGeometry.
+        On exit: The left and right children of every square in the highest level have been
+                 calculated and appended as a new level, with each left child directly followed
+                 by the right child of the same parent. self.order has been increased by 1.
+                 The corners are calculated by the compiled childCornersLoop(...) if backend
+                 is "numba", and by childCorners(...) otherwise.
+        '''
+        parents = numpy.ascontiguousarray(self.corners[-1])
+        count = len(parents)
+        if backend == "numba":
+            children = numpy.empty((count, 2, 4, 2))
+            compiledKernels["childCornersLoop"](parents, self.leftRatio, self.rightRatio,
+                                                self.leftTurn[0], self.leftTurn[1],
+                                                self.rightTurn[0], self.rightTurn[1], children)
+        else:
+            children = childCorners(parents, self.leftRatio, self.rightRatio, self.leftTurn, self.rightTurn)
+
+        angles = numpy.empty((count, 2))
+        angles[:, 0] = self.angles[-1] - math.radians(self.leftAngle)
+        angles[:, 1] = self.angles[-1] + math.radians(self.rightAngle)
+        sides = numpy.empty((count, 2))
+        sides[:, 0] = self.sides[-1] * self.leftRatio
+        sides[:, 1] = self.sides[-1] * self.rightRatio
+        self.corners.append(children.reshape(2 * count, 4, 2))
+        self.angles.append(angles.reshape(2 * count))
+        self.sides.append(sides.reshape(2 * count))
+        self.order = self.order + 1
+
+    def grow(self, order):
+        '''
+        Adds levels until the tree has the given order.
+
+        self: An object of the class TreeGeometry.
+        order: The order the tree should have.
+        On exit: addLevel() has been called until self.order is at least order.
+        '''
+        while self.order < order:
+            self.addLevel()
+
+    def growParallel(self, order, workers, splitLevel = None):
+        '''
+        Adds levels until the tree has the given order, using a pool of processes.
+
+        self: An object of the class TreeGeometry.
+        order: The order the tree should have.
+        workers: The number of processes in the pool.
+        splitLevel: The level where the work is split. Every square of this level is the root
+                    of a subtree that does not depend on the others. If None, the lowest level
+                    with at least four subtrees per process is used.
+        On exit: The tree has been grown to splitLevel in this process. The subtrees below it
+                 have been divided into one contiguous range per task and grown by the pool with
+                 growSubtrees(...), which writes every new level directly into arrays in shared
+                 memory, so no squares are sent back between the processes. The levels of self
+                 are views of those arrays.
+        '''
+        if splitLevel is None:
+            splitLevel = int(math.ceil(math.log(4 * workers, 2)))
+        splitLevel = max(splitLevel, self.order)
+        if order <= splitLevel or workers <= 1:
+            self.grow(order)
+            return
+        self.grow(splitLevel)
+        # The new levels are stored one after the other. Since every left child is directly followed
+        # by its right sibling, the squares of level m below the squares start to stop of the split
+        # level are the squares start * 2 ** (m - splitLevel) to stop * 2 ** (m - splitLevel).
+        squareCount = 2 ** (order + 1) - 2 ** (splitLevel + 1)
+        buffers = (multiprocessing.RawArray("d", 8 * squareCount),
+                   multiprocessing.RawArray("d", squareCount),
+                   multiprocessing.RawArray("d", squareCount))
+        rootCount = 2 ** splitLevel
+        taskCount = min(rootCount, 4 * workers)
+        tasks = []
+        for i in range(taskCount):
+            start = rootCount * i // taskCount
+            stop = rootCount * (i + 1) // taskCount
+            tasks.append((self.leftAngle, self.rightAngle, splitLevel, order, start,
+                          self.corners[splitLevel][start:stop], self.angles[splitLevel][start:stop],
+                          self.sides[splitLevel][start:stop]))
+        pool = multiprocessing.Pool(workers, initGeometryWorker, (buffers,))
+        try:
+            pool.map(growSubtrees, tasks)
+        finally:
+            pool.close()
+            pool.join()
+        corners = numpy.frombuffer(buffers[0]).reshape(squareCount, 4, 2)
+        angles = numpy.frombuffer(buffers[1])
+        sides = numpy.frombuffer(buffers[2])
+        offset = 0
+        for i in range(splitLevel + 1, order + 1):
+            self.corners.append(corners[offset:offset + 2 ** i])
+            self.angles.append(angles[offset:offset + 2 ** i])
+            self.sides.append(sides[offset:offset + 2 ** i])
+            offset = offset + 2 ** i
+        self.order = order
+
+    def flatten(self):
+        '''
+        Returns the corners, orders and angles of all squares as contiguous arrays.
+
+        self: An object of the class TreeGeometry.
+        On exit: A tuple containing an array of shape (n, 4, 2) with the corners, an array of
+                 shape (n,) with the order of every square and an array of shape (n,) with the
+                 angles has been returned. The squares are ordered level by level.
+        '''
+        orders = numpy.concatenate([numpy.full(len(level), i, dtype = numpy.int32)
+                                    for i, level in enumerate(self.corners)])
+        return (numpy.concatenate(self.corners), orders, numpy.concatenate(self.angles))
+
+    def truncated(self, order):
+        '''
+        Returns a TreeGeometry object with the first levels of the tree.
+
+        self: An object of the class TreeGeometry.
+        order: The order of the returned tree, at most self.order.
+        On exit: A TreeGeometry object with the levels 0 to order of self has been returned.
+                 The arrays of the levels are shared, not copied, and adding levels to either
+                 object does not change the other.
+        '''
+        geometry = copy.copy(self)
+        geometry.corners = self.corners[:order + 1]
+        geometry.angles = self.angles[:order + 1]
+        geometry.sides = self.sides[:order + 1]
+        geometry.order = order
+        return geometry
+
+    def toSquares(self):
+        '''
+        Creates a list of Square objects from the stored arrays.
+
+        self: An object of the class TreeGeometry.
+        On exit: A list with one Square object for every stored square has been returned,
+                 ordered level by level.
+        '''
+        listOfSquares = []
+        for i in range(self.order + 1):
+            for corners, angle in zip(self.corners[i].tolist(), self.angles[i].tolist()):
+                square = Square([tuple(corner) for corner in corners], i)
+                square.angle = angle
+                listOfSquares.append(square)
+        return listOfSquares
+
+    def makeIndex(self):
+        '''
+        Returns a SquareIndex object for the squares, creating it the first time.
+
+        self: An object of the class TreeGeometry.
+        On exit: A SquareIndex object for the levels 0 to self.order has been returned and kept
+                 in self.squareIndexes.
+        '''
+        if self.order not in self.squareIndexes:
+            self.squareIndexes[self.order] = SquareIndex(self)
+        return self.squareIndexes[self.order]
+
+class SquareIndex:
+    '''
+    A SquareIndex object is a bounding volume hierarchy over the squares of a TreeGeometry object.
+    The hierarchy is the tree itself: every square is a node whose bounding box contains the
+    square and all squares below it, so a query only visits the subtrees that can contain an
+    answer and runs in time proportional to the height of the tree for small regions.
+
+    Attributes:
+        geometry: The TreeGeometry object that is indexed.
+        boxes: A list with one array of shape (2 ** k, 4) for every level k, containing the
+               smallest x, smallest y, largest x and largest y of the subtree below each square.
+        squareBoxes: A list like boxes, but with the bounding box of each square only.
+    '''
+    def __init__(self, geometry):
+        '''
+        Initiates a SquareIndex object by calculating the bounding boxes of all subtrees.
+
+        self: Object that is to be initiated.
+        geometry: See Attributes.
+        On exit: The bounding boxes have been calculated level by level from the leaves up,
+                 joining the box of every square with the boxes of its two children.
+        '''
+        self.geometry = geometry
+        self.squareBoxes = [numpy.concatenate((level.min(1), level.max(1)), 1) for level in geometry.corners]
+        self.boxes = [None] * (geometry.order + 1)
+        self.boxes[-1] = self.squareBoxes[-1]
+        for i in range(geometry.order - 1, -1, -1):
+            children = self.boxes[i + 1].reshape(-1, 2, 4)
+            box = self.squareBoxes[i].copy()
+            box[:, :2] = numpy.minimum(box[:, :2], children[:, :, :2].min(1))
+            box[:, 2:] = numpy.maximum(box[:, 2:], children[:, :, 2:].max(1))
+            self.boxes[i] = box
+
+    def query(self, box, minSide = 0):
+        '''
+        Finds the squares that intersect a rectangle.
+
+        self: An object of the class SquareIndex.
+        box: A tuple with the smallest x, smallest y, largest x and largest y of the rectangle.
+        minSide: The children of squares with a smaller side than this are not visited.
+        On exit: A list with one sorted array of indices for every level has been returned,
+                 containing the squares of that level whose bounding box intersects the
+                 rectangle. The subtrees whose bounding box does not intersect it have been
+                 skipped without visiting their squares.
+        '''
+        result = []
+        candidates = numpy.zeros(1, dtype = numpy.int64)
+        for i in range(self.geometry.order + 1):
+            boxes = self.boxes[i][candidates]
+            candidates = candidates[(boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) &
+                                    (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1])]
+            boxes = self.squareBoxes[i][candidates]
+            result.append(candidates[(boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) &
+                                     (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1])])
+            if minSide > 0:
+                candidates = candidates[self.geometry.sides[i][candidates] >= minSide]
+            candidates = numpy.stack((2 * candidates, 2 * candidates + 1), 1).reshape(-1)
+        return result
+
+    def pick(self, point):
+        '''
+        Finds the square that is drawn on top at a point.
+
+        self: An object of the class SquareIndex.
+        point: A tuple with the x and y coordinates of the point.
+        On exit: A tuple with the order and the index within its level of the square that
+                 contains the point and is drawn last by Tree.drawTree(...) has been returned,
+                 or None if no square contains the point.
+        '''
+        levels = self.query((point[0], point[1], point[0], point[1]))
+        for i in range(len(levels) - 1, -1, -1):
+            corners = self.geometry.corners[i][levels[i]]
+            if len(corners) == 0:
+                continue
+            # The point is inside a square if it is on the same side of all four edges.
+            edges = numpy.roll(corners, -1, 1) - corners
+            offsets = numpy.array(point, dtype = float) - corners
+            cross = edges[:, :, 0] * offsets[:, :, 1] - edges[:, :, 1] * offsets[:, :, 0]
+            inside = numpy.nonzero((cross >= 0).all(1) | (cross <= 0).all(1))[0]
+            if len(inside) > 0:
+                return (i, int(levels[i][inside[-1]]))
+        return None
+
+class GeometryCache:
+    '''
+    A GeometryCache object keeps the most recently used tree shapes in unit coordinates.
+    The shape of a tree only depends on its order and its angles, so the squares are
+    created with a root square of side 1 whose lower left corner is at the origin, and
+    placed in an image with Tree.placement(...) when the tree is drawn. Only the deepest
+    shape for each pair of angles is stored, since a tree of a lower order consists of
+    its first levels.
+
+    Attributes:
+        maxSquares: The highest number of squares kept in the cache. The least recently
+                    used shapes are removed when there are more squares than this, but
+                    the most recently used shape is always kept.
+        shapes: An OrderedDict with (leftAngle, rightAngle) as keys and TreeGeometry
+                objects as values, ordered from the least to the most recently used.
+        squareCount: The total number of squares in the cache.
+        store: A GeometryStore object where new shapes are looked for before they are created,
+               and where created shapes are saved, or None if shapes are only kept in memory.
+    '''
+    def __init__(self, maxSquares):
+        '''
+        Initiates an empty GeometryCache object.
+
+        self: Object that is to be initiated.
+        maxSquares: See Attributes.
+        On exit: A GeometryCache object without any shapes has been initiated. Note that the
+                 store is initiated as None.
+        '''
+        self.maxSquares = maxSquares
+        self.shapes = collections.OrderedDict()
+        self.squareCount = 0
+        self.store = None
+
+    def get(self, order, leftAngle, rightAngle, workers = 1, splitLevel = None):
+        '''
+        Returns the TreeGeometry object for the given shape, creating it if needed.
+
+        self: An object of the class GeometryCache.
+        order: The order of the tree.
+        leftAngle: The angle the left child of a square is rotated relative to its parent.
+        rightAngle: The angle the right child of a square is rotated relative to its parent.
+        workers: The number of processes used to create missing levels, see
+                 TreeGeometry.growParallel(...).
+        splitLevel: The level where the work is split between the processes.
+        On exit: A TreeGeometry object in unit coordinates with the given order and angles
+                 has been returned and the angles marked as the most recently used. If the
+                 stored shape for the angles had a lower order only the missing levels have
+                 been added to it, and if it had a higher order the returned object shares
+                 its first levels. Missing levels are opened from the store instead of being
+                 created when possible, also from a stored shape of a higher order, and shapes
+                 that had to be created have been saved to it. The least recently used shapes have been removed until the cache fits
+                 within maxSquares.
+        '''
+        key = (leftAngle, rightAngle)
+        if key in self.shapes:
+            geometry = self.shapes.pop(key)
+        else:
+            geometry = TreeGeometry([(0, 0), (1, 0), (1, -1), (0, -1)], leftAngle, rightAngle)
+            self.squareCount = self.squareCount + 1
+        if geometry.order < order and self.store is not None:
+            storedGeometry = self.store.load(order, leftAngle, rightAngle)
+            if storedGeometry is not None:
+                self.squareCount = self.squareCount + 2 ** (order + 1) - 2 ** (geometry.order + 1)
+                geometry = storedGeometry
+        if geometry.order < order:
+            self.squareCount = self.squareCount + 2 ** (order + 1) - 2 ** (geometry.order + 1)
+            geometry.growParallel(order, workers, splitLevel)
+            if self.store is not None:
+                self.store.save(geometry)
+        self.shapes[key] = geometry
+        while self.squareCount > self.maxSquares and len(self.shapes) > 1:
+            oldKey, oldGeometry = self.shapes.popitem(last = False)
+            self.squareCount = self.squareCount - (2 ** (oldGeometry.order + 1) - 1)
+        return geometry.truncated(order)
+
+class GeometryStore:
+    '''
+    A GeometryStore object keeps tree shapes in geometry files in a directory, so that they
+    can be opened again by later programs instead of being created. See saveGeometry(...)
+    for the format of the files.
+
+    Attributes:
+        directory: The directory where the geometry files are kept. It is created if needed.
+        maxBytes: The highest total size of the geometry files. The files that were least
+                  recently used are removed when the files are larger than this, but the
+                  most recently saved file is always kept.
+        minOrder: Shapes with a lower order than this are fast to create and are not saved.
+    '''
+    def __init__(self, directory, maxBytes, minOrder = 16):
+        '''
+        Initiates a GeometryStore object.
+
+        self: Object that is to be initiated.
+        directory: See Attributes.
+        maxBytes: See Attributes.
+        minOrder: See Attributes.
+        On exit: A GeometryStore object has been initiated with the given arguments.
+        '''
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.minOrder = minOrder
+
+    def fileName(self, order, leftAngle, rightAngle):
+        '''
+        Returns the name of the geometry file for the given shape.
+
+        self: An object of the class GeometryStore.
+        order: The order of the tree.
+        leftAngle: The angle the left child of a square is rotated relative to its parent.
+        rightAngle: The angle the right child of a square is rotated relative to its parent.
+        On exit: The path of the geometry file for the shape has been returned.
+        '''
+        return os.path.join(self.directory, "tree_%d_%r_%r.geo" % (order, float(leftAngle), float(rightAngle)))
+
+    def load(self, order, leftAngle, rightAngle):
+        '''
+        Opens the stored geometry file for the given shape, if there is one.
+
+        self: An object of the class GeometryStore.
+        order: The order of the tree.
+        leftAngle: The angle the left child of a square is rotated relative to its parent.
+        rightAngle: The angle the right child of a square is rotated relative to its parent.
+        On exit: If the shape has been stored with the given order or a higher one, the file
+                 with the lowest such order has been opened with loadGeometry(...) and marked
+                 as the most recently used, and a TreeGeometry object with its first levels up
+                 to the given order is returned. Otherwise None is returned.
+        '''
+        if not os.path.isdir(self.directory):
+            return None
+        suffix = os.path.basename(self.fileName(0, leftAngle, rightAngle))[len("tree_0"):]
+        storedOrders = []
+        for name in os.listdir(self.directory):
+            if name.startswith("tree_") and name.endswith(suffix):
+                storedOrder = name[len("tree_"):-len(suffix)]
+                if storedOrder.isdigit() and int(storedOrder) >= order:
+                    storedOrders.append(int(storedOrder))
+        if not storedOrders:
+            return None
+        fileName = self.fileName(min(storedOrders), leftAngle, rightAngle)
+        os.utime(fileName, None)
+        return loadGeometry(fileName).truncated(order)
+
+    def save(self, geometry):
+        '''
+        Writes a shape to the store and removes the least recently used files.
+
+        self: An object of the class GeometryStore.
+        geometry: A TreeGeometry object in unit coordinates.
+        On exit: If the order of geometry is at least minOrder, it has been written with
+                 saveGeometry(...), and the least recently used files have been removed
+                 until the files fit within maxBytes.
+        '''
+        if geometry.order < self.minOrder:
+            return
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        fileName = self.fileName(geometry.order, geometry.leftAngle, geometry.rightAngle)
+        # Write to a temporary file first so that a file is never seen half written.
+        saveGeometry(geometry, fileName + ".part")
+        if os.path.exists(fileName):
+            os.remove(fileName)
+        os.rename(fileName + ".part", fileName)
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".geo"):
+                path = os.path.join(self.directory, name)
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+        files.sort()
+        totalBytes = sum(f[1] for f in files)
+        for modified, fileSize, path in files:
+            if totalBytes <= self.maxBytes:
+                break
+            if path == fileName:
+                continue
+            os.remove(path)
+            totalBytes = totalBytes - fileSize
+
+class PNGWriter:
+    '''
+    A PNGWriter object writes a PNG file a few rows at a time, so that an image can be saved
+    without ever being in memory as a whole.
+
+    Attributes:
+        file: The file the image is written to.
+        size: A tuple with the width and the height of the image.
+        bands: The number of bytes per pixel, 1 for a palette image and 3 for an RGB image.
+        level: The zlib compression level.
+        frames: The number of frames of an animated PNG (APNG), or None for a single image.
+        sequence: The sequence number of the next frame control or frame data chunk.
+        compressor: The zlib compression object that all rows are passed through.
+        rowsWritten: The number of rows written so far, or for an animation the number of
+                     frames written so far.
+    '''
+    def __init__(self, fileName, size, palette = None, level = 6, frames = None):
+        '''
+        Opens the file and writes the header of the PNG file.
+
+        self: Object that is to be initiated.
+        fileName: The name of the file.
+        size: See Attributes.
+        palette: A list with the RGB values of the palette, at most 256 colours, for an image
+                 where every pixel is an index into the palette. None for an RGB image.
+        level: The zlib compression level, from 1 (fastest) to 9 (smallest).
+        frames: See Attributes.
+        On exit: The file has been opened and the PNG signature, the IHDR chunk, for an
+                 animation the acTL chunk and, for a palette image, the PLTE chunk have been
+                 written.
+        '''
+        self.file = open(fileName, "wb")
+        self.size = size
+        self.level = level
+        self.frames = frames
+        self.sequence = 0
+        self.bands = 3
+        colourType = 2
+        if palette is not None:
+            self.bands = 1
+            colourType = 3
+        self.compressor = zlib.compressobj(level)
+        self.rowsWritten = 0
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self.chunk(b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, colourType, 0, 0, 0))
+        if frames is not None:
+            # The animation is repeated forever.
+            self.chunk(b"acTL", struct.pack(">II", frames, 0))
+        if palette is not None:
+            self.chunk(b"PLTE", struct.pack("%dB" % len(palette), *palette))
+
+    def chunk(self, kind, data):
+        '''
+        Writes one chunk of the PNG file.
+
+        self: An object of the class PNGWriter.
+        kind: The four letter type of the chunk as bytes.
+        data: The content of the chunk as bytes.
+        On exit: The length, the type, the content and the CRC of the chunk have been written.
+        '''
+        self.file.write(struct.pack(">I", len(data)) + kind + data)
+        self.file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    def writeRows(self, rows):
+        '''
+        Compresses a number of rows of pixels and writes them to the file.
+
+        self: An object of the class PNGWriter.
+        rows: A NumPy array of type uint8 with shape (n, width) for a palette image and
+              (n, width, 3) for an RGB image, containing the next n rows of the image.
+        On exit: Every row has been given the filter type 0 and passed to the compressor,
+                 and the compressed data that was ready has been written as an IDAT chunk.
+                 Only the compressor keeps data between calls, so the memory used does not
+                 depend on the height of the image.
+        '''
+        rows = rows.reshape(len(rows), -1)
+        filtered = numpy.zeros((len(rows), rows.shape[1] + 1), dtype = numpy.uint8)
+        filtered[:, 1:] = rows
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self.chunk(b"IDAT", data)
+        self.rowsWritten = self.rowsWritten + len(rows)
+
+    def writeFrame(self, rows, delay):
+        '''
+        Compresses one frame of an animation and writes it to the file.
+
+        self: An object of the class PNGWriter.
+        rows: A NumPy array with all rows of the frame, see writeRows(...).
+        delay: The time the frame is shown, in milliseconds.
+        On exit: A fcTL chunk with the delay and the compressed pixels of the frame have been
+                 written, the pixels of the first frame as IDAT chunks, so that it is also the
+                 image shown by programs without support for animations, and the others as
+                 fdAT chunks.
+        '''
+        self.chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.sequence, self.size[0], self.size[1],
+                                         0, 0, delay, 1000, 0, 0))
+        self.sequence = self.sequence + 1
+        rows = rows.reshape(len(rows), -1)
+        filtered = numpy.zeros((len(rows), rows.shape[1] + 1), dtype = numpy.uint8)
+        filtered[:, 1:] = rows
+        data = zlib.compress(filtered.tobytes(), self.level)
+        if self.rowsWritten == 0:
+            self.chunk(b"IDAT", data)
+        else:
+            self.chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+            self.sequence = self.sequence + 1
+        self.rowsWritten = self.rowsWritten + 1
+
+    def close(self):
+        '''
+        Writes the end of the PNG file and closes it.
+
+        self: An object of the class PNGWriter.
+        On exit: The rest of the compressed data and the IEND chunk have been written, and the
+                 file has been closed. A ValueError has been raised if the number of rows
+                 written differs from the height of the image, or for an animation if the
+                 number of frames written differs from frames.
+        '''
+        if self.frames is not None:
+            self.chunk(b"IEND", b"")
+            self.file.close()
+            if self.rowsWritten != self.frames:
+                raise ValueError("%d frames were written to an animation with %d frames" %
+                                 (self.rowsWritten, self.frames))
+            return
+        self.chunk(b"IDAT", self.compressor.flush())
+        self.chunk(b"IEND", b"")
+        self.file.close()
+        if self.rowsWritten != self.size[1]:
+            raise ValueError("%d rows were written to an image with a height of %d" %
+                             (self.rowsWritten, self.size[1]))
+
+class SVGWriter:
+    '''
+    An SVGWriter object writes the squares of a tree to an SVG file as they are found, one
+    group of paths per level, without building the document in memory.
+
+    Attributes:
+        file: The file the drawing is written to.
+        unit: The number of steps per pixel that the coordinates are rounded to.
+    '''
+    def __init__(self, fileName, size, background, unit):
+        '''
+        Opens the file and writes the header of the SVG file.
+
+        self: Object that is to be initiated.
+        fileName: The name of the file.
+        size: A tuple with the width and the height of the drawing in pixels.
+        background: A tuple with the RGB colour of the background.
+        unit: See Attributes.
+        On exit: The file has been opened and the svg element and a rectangle with the
+                 background colour have been written.
+        '''
+        self.file = open(fileName, "w")
+        self.unit = unit
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                        '<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" viewBox="0 0 %d %d">\n'
+                        '<rect width="%d" height="%d" fill="#%02x%02x%02x"/>\n'
+                        % ((size[0], size[1]) * 3 + tuple(background)))
+
+    def beginLevel(self, fillColour, outlineColour):
+        '''
+        Starts the group of one level of the tree.
+
+        self: An object of the class SVGWriter.
+        fillColour: A tuple with the RGB colour of the squares.
+        outlineColour: A tuple with the RGB colour of the outlines, or None.
+        On exit: A g element has been opened with the colours of the level, so that they are
+                 written once and not for every square. The group is scaled by 1 / unit, so
+                 the coordinates of the paths are integers.
+        '''
+        stroke = 'stroke="none"'
+        if outlineColour is not None:
+            stroke = 'stroke="#%02x%02x%02x" stroke-width="%d"' % (tuple(outlineColour) + (self.unit,))
+        self.file.write('<g fill="#%02x%02x%02x" %s transform="scale(%r)">\n'
+                        % (tuple(fillColour) + (stroke, 1.0 / self.unit)))
+
+    def writeSquares(self, points):
+        '''
+        Writes a number of squares as one path.
+
+        self: An object of the class SVGWriter.
+        points: A list with the coordinates of the corners of the squares in steps of
+                1 / unit pixels, eight integers per square.
+        On exit: A path element has been written with one closed subpath per square. Only
+                 the first corner is absolute, the others are relative to the corner before
+                 them, which keeps the numbers short.
+        '''
+        columns = [points[0::8], points[1::8]]
+        for k in range(2, 8):
+            columns.append(list(map(operator.sub, points[k::8], points[k - 2::8])))
+        self.file.write('<path d="')
+        self.file.write(("M%d %dl%d %d %d %d %d %dz" * len(columns[0])) %
+                        tuple(itertools.chain.from_iterable(zip(*columns))))
+        self.file.write('"/>\n')
+
+    def endLevel(self):
+        '''
+        Ends the group of one level of the tree.
+
+        self: An object of the class SVGWriter.
+        On exit: The g element of the level has been closed.
+        '''
+        self.file.write("</g>\n")
+
+    def close(self):
+        '''
+        Writes the end of the SVG file and closes it.
+
+        self: An object of the class SVGWriter.
+        On exit: The svg element has been closed and the file has been closed.
+        '''
+        self.file.write("</svg>\n")
+        self.file.close()
+
+class PDFWriter:
+    '''
+    A PDFWriter object writes the squares of a tree to a one page PDF file as they are found.
+    The drawing is a single content stream that is compressed while it is written, and its
+    length is written as a separate object at the end, when it is known.
+
+    Attributes:
+        file: The file the drawing is written to.
+        unit: The number of steps per pixel that the coordinates are rounded to.
+        offsets: A list with the position in the file of every object written so far.
+        compressor: The zlib compression object that the content stream is passed through.
+        streamStart: The position in the file where the content stream starts.
+        paint: The PDF operator that fills, and if there is an outline strokes, the squares
+               of the current level.
+    '''
+    def __init__(self, fileName, size, background, unit):
+        '''
+        Opens the file and writes the header and the page of the PDF file.
+
+        self: Object that is to be initiated.
+        fileName: The name of the file.
+        size: A tuple with the width and the height of the page, one pixel being one point.
+        background: A tuple with the RGB colour of the background.
+        unit: See Attributes.
+        On exit: The file has been opened, the catalog, the page tree and the page have been
+                 written and the content stream has been started with a transform from steps
+                 of 1 / unit pixels, with y pointing down, to the page, and the background.
+        '''
+        self.file = open(fileName, "wb")
+        self.unit = unit
+        self.offsets = []
+        self.paint = "f"
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.writeObject("<< /Type /Catalog /Pages 2 0 R >>")
+        self.writeObject("<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
+        self.writeObject("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents 4 0 R >>" % tuple(size))
+        self.offsets.append(self.file.tell())
+        self.file.write(b"4 0 obj\n<< /Length 5 0 R /Filter /FlateDecode >>\nstream\n")
+        self.streamStart = self.file.tell()
+        self.compressor = zlib.compressobj(6)
+        self.write("%r 0 0 %r 0 %d cm\n%s rg 0 0 %d %d re f\n" %
+                   (1.0 / unit, -1.0 / unit, size[1], self.colour(background), size[0] * unit, size[1] * unit))
+
+    def writeObject(self, text):
+        '''
+        Writes an object that is not a stream.
+
+        self: An object of the class PDFWriter.
+        text: The content of the object.
+        On exit: The object has been written with the next object number and its position
+                 has been added to offsets.
+        '''
+        self.offsets.append(self.file.tell())
+        self.file.write(("%d 0 obj\n%s\nendobj\n" % (len(self.offsets), text)).encode("ascii"))
+
+    def write(self, text):
+        '''
+        Adds text to the content stream.
+
+        self: An object of the class PDFWriter.
+        text: The PDF operators that are added.
+        On exit: The text has been passed to the compressor and the compressed data that was
+                 ready has been written to the file.
+        '''
+        self.file.write(self.compressor.compress(text.encode("ascii")))
+
+    def colour(self, colour):
+        '''
+        Converts an RGB colour to the operands of a PDF colour operator.
+
+        self: An object of the class PDFWriter.
+        colour: A tuple with the RGB colour, from 0 to 255.
+        On exit: A string with the three components from 0 to 1 has been returned.
+        '''
+        return "%.3g %.3g %.3g" % tuple(component / 255.0 for component in colour)
+
+    def beginLevel(self, fillColour, outlineColour):
+        '''
+        Sets the colours of one level of the tree.
+
+        self: An object of the class PDFWriter.
+        fillColour, outlineColour: See SVGWriter.beginLevel(...).
+        On exit: The fill colour, and the outline colour and a line width of one pixel if
+                 there is an outline, have been set once for all squares of the level.
+        '''
+        self.write("%s rg\n" % self.colour(fillColour))
+        self.paint = "f"
+        if outlineColour is not None:
+            self.write("%s RG %d w\n" % (self.colour(outlineColour), self.unit))
+            self.paint = "B"
+
+    def writeSquares(self, points):
+        '''
+        Writes a number of squares as one path.
+
+        self: An object of the class PDFWriter.
+        points: See SVGWriter.writeSquares(...).
+        On exit: One closed subpath per square has been added to the content stream, and
+                 the path has been filled, and stroked if there is an outline.
+        '''
+        self.write(("%d %d m %d %d l %d %d l %d %d l h\n" * (len(points) // 8)) % tuple(points) +
+                   self.paint + "\n")
+
+    def endLevel(self):
+        '''
+        Ends one level of the tree.
+
+        self: An object of the class PDFWriter.
+        On exit: Nothing has been done, since every path is painted when it is written.
+        '''
+        pass
+
+    def close(self):
+        '''
+        Writes the end of the PDF file and closes it.
+
+        self: An object of the class PDFWriter.
+        On exit: The content stream has been ended, its length written as object 5, and
+                 the cross-reference table and the trailer have been written before the
+                 file was closed.
+        '''
+        self.file.write(self.compressor.flush())
+        length = self.file.tell() - self.streamStart
+        self.file.write(b"\nendstream\nendobj\n")
+        self.writeObject("%d" % length)
+        xref = self.file.tell()
+        table = "xref\n0 %d\n0000000000 65535 f \n" % (len(self.offsets) + 1)
+        for offset in self.offsets:
+            table = table + "%010d 00000 n \n" % offset
+        table = table + "trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(self.offsets) + 1, xref)
+        self.file.write(table.encode("ascii"))
+        self.file.close()
+
+class FrameRenderer:
+    '''
+    A FrameRenderer object draws the frames of an animation of a tree, keeping the squares and
+    the image between the frames.
+
+    Attributes:
+        tree: A copy of the Tree object that is animated, whose angles, scale and offset are
+              changed for every frame.
+        defaults: A dictionary with the angles, the scale and the offset of the Tree object
+                  that is animated.
+        size: The size of the frames.
+        geometry: A TreeGeometry object of the tree in unit coordinates that only this object
+                  uses, so that it can be changed in place.
+        pixels: A NumPy array of shape (height, width) with the level index of every pixel of
+                the last frame.
+        outlineIndex: The index of the outline colour, or None if there is no outline.
+    '''
+    def __init__(self, tree, size):
+        '''
+        Initiates a FrameRenderer object.
+
+        self: Object that is to be initiated.
+        tree: The Tree object that is animated.
+        size: See Attributes.
+        On exit: The tree has been copied, its squares created once in unit coordinates and
+                 an array for the frames has been allocated.
+        '''
+        self.tree = copy.copy(tree)
+        self.defaults = dict((name, getattr(tree, name)) for name in
+                             ("angleL", "angleR", "scale", "positionChangex", "positionChangey"))
+        self.size = size
+        self.geometry = TreeGeometry([(0, 0), (1, 0), (1, -1), (0, -1)], tree.angleL, tree.angleR)
+        self.geometry.grow(tree.order)
+        self.pixels = numpy.zeros((size[1], size[0]), dtype = numpy.uint8)
+        self.outlineIndex = None
+        if tree.outline[0] is not None:
+            self.outlineIndex = tree.order + 2
+
+    def render(self, settings):
+        '''
+        Draws one frame of the animation.
+
+        self: An object of the class FrameRenderer.
+        settings: A dictionary with the values of angleL, angleR, scale, positionChangex and
+                  positionChangey for the frame, see Tree. Missing values are taken from the
+                  tree that is animated, not from the frame before, so that the frames do not
+                  depend on each other.
+        On exit: If the angles have changed, the squares have been calculated again in place
+                 with TreeGeometry.setAngles(...), otherwise only the transform to the image
+                 has changed. The frame has been drawn into pixels in the same way as
+                 Tree.drawTree(...) draws it with rasterize and palette, and pixels has been
+                 returned. It is overwritten by the next frame.
+        '''
+        tree = self.tree
+        for name in self.defaults:
+            setattr(tree, name, settings.get(name, self.defaults[name]))
+        if (tree.angleL, tree.angleR) != (self.geometry.leftAngle, self.geometry.rightAngle):
+            self.geometry.setAngles(tree.angleL, tree.angleR)
+        width, cornerx, cornery = tree.placement(self.size)
+        self.pixels.fill(0)
+        for i in range(tree.order + 1):
+            levelCorners = self.geometry.corners[i] * width + (cornerx, cornery)
+            low = levelCorners.min(1)
+            high = levelCorners.max(1)
+            inside = ((high[:, 0] >= 0) & (low[:, 0] <= self.size[0]) &
+                      (high[:, 1] >= 0) & (low[:, 1] <= self.size[1]))
+            fillQuads(self.pixels, levelCorners[inside], i + 1)
+            edgeColour = i + 1
+            if self.outlineIndex is not None:
+                edgeColour = self.outlineIndex
+            outlineQuads(self.pixels, levelCorners[inside], edgeColour)
+        return self.pixels
+
+# The shapes used by Tree.drawTree(...), about 80 bytes per square.
+geometryCache = GeometryCache(2 ** 20)
 
 class Tree:
     '''
@@ -239,6 +1506,12 @@ class Tree:
                square is one eight of the width of the image.
         positionChangex: The offset of the tree along the x-axis.
         positionChangey: The offset of the tree along the y-axis.
+        workers: The number of processes used to create the squares of the tree, and to draw
+                 the tiles of a rasterized image, see renderParallel(...).
+        splitLevel: The level where the creation of the squares is split between the processes,
+                    or None to choose it from the number of processes.
+        levelImage: A tuple with the settings and the image of level indices that drawTree(...)
+                    drew last with palette, or None.
     '''
     def __init__(self, order, rootColour, branchColour, outline, background, angles, scale):
         '''
@@ -253,7 +1526,7 @@ class Tree:
         angles: Tuple containing angleL and angleR (see Attributes).
         scale: See Attributes.
         On exit: A Tree object has been initiated. Note that the positionChange is initiated
-                 as 0 for both x and y.
+                 as 0 for both x and y, workers as 1 and splitLevel and levelImage as None.
         '''
         self.order = order
         self.rootColour = rootColour
@@ -265,6 +1538,9 @@ class Tree:
         self.scale = scale
         self.positionChangex = 0
         self.positionChangey = 0
+        self.workers = 1
+        self.splitLevel = None
+        self.levelImage = None
 
     def firstSquare(self, size):
         '''
@@ -282,38 +1558,892 @@ class Tree:
         y2 = y1 - width
         return Square([(x1, y1), (x2, y1), (x2, y2), (x1, y2)], 0)
 
-    def drawTree(self, size, save = False, name = "pythagorasTree"):
+    def makeGeometry(self, size):
         '''
-        Creates an image and draws a tree on it.
+        Creates a TreeGeometry object with all the squares of the tree.
 
         self: An object of the class Tree.
-        size: The size of the image.
-        save: A boolean variable determining whether the image should be saved or not.
-        name: The name the image will have if saved.
-        On exit: An image with a pythagorean tree has been drawn using the attributes of
-                 the Tree object to define colours and the shape of the tree. The image
-                 is returned and if save the image has been saved.
+        size: The size of the image the tree will be drawn on.
+        On exit: A TreeGeometry object has been created from the root square given by
+                 firstSquare(...) and grown to the order of the tree. The object is returned.
+        '''
+        geometry = TreeGeometry(self.firstSquare(size).corners, self.angleL, self.angleR)
+        geometry.grow(self.order)
+        return geometry
+
+    def unitGeometry(self):
+        '''
+        Returns the shape of the tree in unit coordinates from geometryCache.
+
+        self: An object of the class Tree.
+        On exit: A TreeGeometry object for the order and the angles of the tree, with a
+                 root square of side 1 whose lower left corner is at the origin, has been
+                 returned. Levels already in geometryCache are reused, so changing the
+                 order only creates the new levels, if any. If workers is more than 1 the
+                 new levels are created by a pool of processes.
+        '''
+        return geometryCache.get(self.order, self.angleL, self.angleR, self.workers, self.splitLevel)
+
+    def placement(self, size):
+        '''
+        Calculates the affine transform from unit coordinates to the image.
+
+        self: An object of the class Tree.
+        size: The size of the image the tree will be drawn on.
+        On exit: A tuple with the side of the root square and the x and y coordinates of its
+                 lower left corner has been returned, taking into account the scale and the
+                 offset for the tree as in firstSquare(...). A point (x, y) in unit coordinates
+                 is placed at (side * x + cornerx, side * y + cornery) in the image.
+        '''
+        width = size[0] / 8.0 * self.scale
+        return (width, size[0] / 2.0 - width / 2.0 + self.positionChangex,
+                8.0 / 10 * size[1] + self.positionChangey)
+
+    def pickSquare(self, size, point):
+        '''
+        Finds the square that is drawn on top at a point in the image.
+
+        self: An object of the class Tree.
+        size: The size of the image the tree is drawn on.
+        point: A tuple with the x and y coordinates of the point in the image.
+        On exit: The Square object, in the coordinates of the image, that is visible at the
+                 point when the tree is drawn with drawTree(...) has been returned, or None if
+                 the point is on the background or the scale of the tree is 0. The search uses
+                 the SquareIndex object of unitGeometry(...).
+        '''
+        width, cornerx, cornery = self.placement(size)
+        if width == 0:
+            return None
+        geometry = self.unitGeometry()
+        found = geometry.makeIndex().pick(((point[0] - cornerx) / width, (point[1] - cornery) / width))
+        if found is None:
+            return None
+        order, index = found
+        corners = geometry.corners[order][index] * width + (cornerx, cornery)
+        square = Square([tuple(corner) for corner in corners.tolist()], order)
+        square.angle = float(geometry.angles[order][index])
+        return square
+
+    def squaresInBox(self, size, box):
+        '''
+        Finds the squares that intersect a rectangle in the image.
+
+        self: An object of the class Tree.
+        size: The size of the image the tree is drawn on.
+        box: A tuple with the smallest x, smallest y, largest x and largest y of the rectangle
+             in the image.
+        On exit: A list with the Square objects, in the coordinates of the image, whose bounding
+                 boxes intersect the rectangle has been returned in the order they are drawn.
+                 The list is empty if the scale of the tree is 0. The search uses the
+                 SquareIndex object of unitGeometry(...).
+        '''
+        width, cornerx, cornery = self.placement(size)
+        if width == 0:
+            return []
+        geometry = self.unitGeometry()
+        x1, x2 = sorted(((box[0] - cornerx) / width, (box[2] - cornerx) / width))
+        y1, y2 = sorted(((box[1] - cornery) / width, (box[3] - cornery) / width))
+        listOfSquares = []
+        for order, indices in enumerate(geometry.makeIndex().query((x1, y1, x2, y2))):
+            corners = geometry.corners[order][indices] * width + (cornerx, cornery)
+            for squareCorners, angle in zip(corners.tolist(), geometry.angles[order][indices].tolist()):
+                square = Square([tuple(corner) for corner in squareCorners], order)
+                square.angle = angle
+                listOfSquares.append(square)
+        return listOfSquares
+
+    def squareAt(self, path, size):
+        '''
+        Calculates the square reached by a path of left and right turns without creating the tree.
+
+        self: An object of the class Tree.
+        path: A string with the letters L and R, where L means taking the left child and R the
+              right child, starting at the root. The empty string is the root itself. The path
+              may be longer than the order of the tree.
+        size: The size of the image the tree is drawn on.
+        On exit: The Square object, in the coordinates of the image, that is reached by the
+                 path has been returned. Its order is the length of the path. See iterPaths(...).
+                 A ValueError has been raised if the path contains any other letters.
+        '''
+        for square in self.iterPaths([path], size):
+            return square
+
+    def iterPaths(self, paths, size):
+        '''
+        Generator that yields the squares reached by a sequence of paths.
+
+        self: An object of the class Tree.
+        paths: An iterable with paths as described in squareAt(...). It is only read one path
+               at a time, so it can be a generator.
+        size: The size of the image the tree is drawn on.
+        On exit: The Square object reached by every path has been yielded in the order of the
+                 paths. A square is given by the position of its lower left corner a and the
+                 vector e along its lower side, both as complex numbers, so that a point z of
+                 the unit square is placed at a + e * z. A child is the same kind of transform
+                 applied to its parent, a + e * offset and e * turn, so a path of length n
+                 costs n complex multiplications. The transforms along the previous path are
+                 kept, and only the part of a path after the prefix it shares with the
+                 previous path is calculated, so the squares along one branch, the paths
+                 "", "L", "LR", ..., are found in time proportional to its length.
+                 A ValueError has been raised for a path with letters other than L and R.
+        '''
+        base = math.sin(math.radians(180 - (self.angleL + self.angleR)))
+        leftRatio = math.sin(math.radians(self.angleR)) / base
+        rightRatio = math.sin(math.radians(self.angleL)) / base
+        # The turn and the offset of the lower left corner for both children, in unit coordinates.
+        leftTurn = leftRatio * complex(math.cos(math.radians(-self.angleL)), math.sin(math.radians(-self.angleL)))
+        rightTurn = rightRatio * complex(math.cos(math.radians(self.angleR)), math.sin(math.radians(self.angleR)))
+        steps = {"L": (-1j, leftTurn, math.radians(-self.angleL)),
+                 "R": (1 - 1j - rightTurn, rightTurn, math.radians(self.angleR))}
+        root = self.firstSquare(size)
+        # Every element is the position, side vector and angle of one square along the previous path.
+        transforms = [(complex(*root.corners[0]), complex(root.side, 0), 0.0)]
+        previous = ""
+        for path in paths:
+            if path.upper().strip("LR"):
+                raise ValueError("A path can only contain the letters L and R, got %r" % path)
+            path = path.upper()
+            shared = 0
+            for turn, previousTurn in zip(path, previous):
+                if turn != previousTurn:
+                    break
+                shared += 1
+            del transforms[shared + 1:]
+            for turn in path[shared:]:
+                position, side, angle = transforms[-1]
+                offset, childTurn, childAngle = steps[turn]
+                transforms.append((position + side * offset, side * childTurn, angle + childAngle))
+            previous = path
+            position, side, angle = transforms[-1]
+            corners = [position, position + side, position + side * (1 - 1j), position - side * 1j]
+            square = Square([(corner.real, corner.imag) for corner in corners], len(path))
+            square.angle = angle
+            yield square
+
+    def zoom(self, factor, size):
+        '''
+        Scales the tree by the given factor around the centre of the image.
+
+        self: An object of the class Tree.
+        factor: The factor the tree will be scaled by.
+        size: The size of the image the tree is drawn on.
+        On exit: self.scale has been multiplied by factor and the offset of the tree has
+                 been updated so that the point in the centre of the image stays in place.
+        '''
+        self.scale = self.scale * factor
+        self.positionChangex = self.positionChangex * factor
+        self.positionChangey = (self.positionChangey + 3.0 / 10 * size[1]) * factor - 3.0 / 10 * size[1]
+
+    def fitToImage(self, size, margin = 2):
+        '''
+        Sets the scale and the offset so that the whole tree fills the image.
+
+        self: An object of the class Tree.
+        size: The size of the image the tree will be drawn on.
+        margin: The number of pixels left between the tree and the edges of the image.
+        On exit: The bounding box of the tree has been calculated with treeExtent(...), and
+                 self.scale, self.positionChangex and self.positionChangey have been updated
+                 so that the box is as large as possible and centred in the image.
+        '''
+        minx, miny, maxx, maxy = treeExtent(self.angleL, self.angleR, self.order)
+        width = min((size[0] - 2.0 * margin) / (maxx - minx), (size[1] - 2.0 * margin) / (maxy - miny))
+        cornerx = margin + (size[0] - 2.0 * margin - (maxx - minx) * width) / 2.0 - minx * width
+        cornery = margin + (size[1] - 2.0 * margin - (maxy - miny) * width) / 2.0 - miny * width
+        self.scale = width * 8.0 / size[0]
+        self.positionChangex = cornerx - (size[0] / 2.0 - width / 2.0)
+        self.positionChangey = cornery - 8.0 / 10 * size[1]
+
+    def iterVisible(self, size, level, minSide = 1.0):
+        '''
+        Generator that yields the visible squares of one level of the tree.
+
+        self: An object of the class Tree.
+        size: The size of the image the tree will be drawn on.
+        level: The order of the squares that will be yielded.
+        minSide: Squares with a side smaller than this, in pixels, are drawn but their
+                 children are not created.
+        On exit: The squares of the given order that can be seen in the image have been
+                 yielded as Square objects, in the same order as makeTree(...) creates them.
+                 A subtree is skipped as soon as the circle given by subtreeRadii(...) around
+                 its root square lies outside the image, and the subtree of a square smaller
+                 than minSide is skipped entirely. Every square is placed relative to its
+                 parent's own corner and base edge, and all positions are kept relative to
+                 the centre of the image, so deep zooms do not lose precision.
+        '''
+        radii = subtreeRadii(self.angleL, self.angleR, self.order)
+        base = math.sin(math.radians(180 - (self.angleL + self.angleR)))
+        leftRatio = math.sin(math.radians(self.angleR)) / base
+        rightRatio = math.sin(math.radians(self.angleL)) / base
+        leftCos, leftSin = math.cos(math.radians(self.angleL)), math.sin(math.radians(self.angleL))
+        rightCos, rightSin = math.cos(math.radians(self.angleR)), math.sin(math.radians(self.angleR))
+        centrex = size[0] / 2.0
+        centrey = size[1] / 2.0
+        root = self.firstSquare(size)
+        # Every square is stored as its lower left corner relative to the centre of the image,
+        # its base edge (the vector to the lower right corner), its order and its angle.
+        stack = [(root.corners[0][0] - centrex, root.corners[0][1] - centrey, root.side, 0.0, 0, 0.0)]
+        while stack:
+            x, y, edgex, edgey, order, angle = stack.pop()
+            side = math.sqrt(edgex * edgex + edgey * edgey)
+            # The centre of the square and the radius of the circle containing its subtree.
+            middlex = x + (edgex + edgey) / 2.0
+            middley = y + (edgey - edgex) / 2.0
+            radius = side * radii[self.order - order] + 1
+            if (middlex + radius < -centrex or middlex - radius > centrex or
+                middley + radius < -centrey or middley - radius > centrey):
+                continue
+            if order == level:
+                square = Square([(x + centrex, y + centrey),
+                                 (x + edgex + centrex, y + edgey + centrey),
+                                 (x + edgex + edgey + centrex, y + edgey - edgex + centrey),
+                                 (x + edgey + centrex, y - edgex + centrey)], order)
+                square.angle = angle
+                yield square
+                continue
+            if side < minSide:
+                continue
+            rightx = rightRatio * (edgex * rightCos - edgey * rightSin)
+            righty = rightRatio * (edgey * rightCos + edgex * rightSin)
+            stack.append((x + edgex + edgey - rightx, y + edgey - edgex - righty, rightx, righty,
+                          order + 1, angle + math.radians(self.angleR)))
+            stack.append((x + edgey, y - edgex,
+                          leftRatio * (edgex * leftCos + edgey * leftSin),
+                          leftRatio * (edgey * leftCos - edgex * leftSin),
+                          order + 1, angle - math.radians(self.angleL)))
+
+    def stampLevel(self, img, level, geometry, placement, fillColour, outlineColour, spriteError, sprites):
+        '''
+        Draws one level of the tree by stamping sprites of the subtrees below the leaves of geometry.
+
+        self: An object of the class Tree.
+        img: The "RGB" or "L" image the level will be drawn on.
+        level: The order of the squares that will be drawn. It is higher than geometry.order.
+        geometry: A TreeGeometry object in unit coordinates whose highest level contains the roots
+                  of the subtrees.
+        placement: The tuple returned by placement(...) for the image.
+        fillColour: The colour of the squares of the level, a tuple for an "RGB" image and an
+                    integer for an "L" image.
+        outlineColour: The colour of the outlines in the same form, or None.
+        spriteError: The highest distance in pixels that a square may be moved from its exact
+                     position. It must be larger than 0.
+        sprites: A dictionary where the sprites are kept between the levels.
+        On exit: The squares of the level have been drawn. Two subtree roots with the same number
+                 of left turns on the way from the root of the tree have the same side and angle,
+                 so their subtrees only differ by a translation. The squares of the level are drawn
+                 once for every such class of roots into a sprite, for every sub-pixel offset
+                 needed to keep the error within spriteError, and the sprites have been pasted at
+                 every root in the same order as makeTree(...) creates the squares. There is one
+                 Image.paste(...) call for every root on purpose: the subtrees overlap, and
+                 pasting them one at a time keeps the later squares on top, as when they are
+                 drawn as polygons, while every paste blends a whole sprite in C. This replaces
+                 2 ** (level - geometry.order) polygons per root with a single call.
+        '''
+        rootLevel = geometry.order
+        roots = geometry.corners[rootLevel][:, 0] * placement[0] + placement[1:]
+        # Count the left turns of every root from the bits of its index, where 0 means left.
+        index = numpy.arange(len(roots))
+        rightTurns = numpy.zeros(len(roots), dtype = int)
+        for i in range(rootLevel):
+            rightTurns = rightTurns + ((index >> i) & 1)
+        leftTurns = rootLevel - rightTurns
+        phases = max(1, int(math.ceil(0.5 / spriteError)))
+        for root in range(len(roots)):
+            leftCount = leftTurns[root]
+            if (leftCount, level) not in sprites:
+                # The squares of the level below the first root of this class, in pixels.
+                first = int(numpy.nonzero(leftTurns == leftCount)[0][0])
+                subtree = TreeGeometry(geometry.corners[rootLevel][first] * placement[0] + placement[1:],
+                                       self.angleL, self.angleR)
+                subtree.grow(level - rootLevel)
+                sprites[(leftCount, level)] = (roots[first], subtree.corners[-1])
+            origin, corners = sprites[(leftCount, level)]
+            offset = numpy.round((roots[root] - origin) * phases).astype(int)
+            phase = (int(offset[0] % phases), int(offset[1] % phases))
+            key = (leftCount, level, phase)
+            if key not in sprites:
+                shifted = corners + numpy.array(phase, dtype = float) / phases
+                low = numpy.floor(shifted.reshape(-1, 2).min(0)).astype(int) - 1
+                high = numpy.ceil(shifted.reshape(-1, 2).max(0)).astype(int) + 2
+                # The sprite has the mode of the image with an alpha band, "RGBA" or "LA".
+                sprite = Image.new(img.mode + "A", tuple(high - low))
+                spriteDraw = ImageDraw.Draw(sprite)
+                fill = (fillColour, 255)
+                if img.mode == "RGB":
+                    fill = tuple(fillColour) + (255,)
+                outline = None
+                if outlineColour is not None:
+                    outline = (outlineColour, 255)
+                    if img.mode == "RGB":
+                        outline = tuple(outlineColour) + (255,)
+                for squareCorners in (shifted - low).reshape(-1, 8).tolist():
+                    spriteDraw.polygon(squareCorners, outline = outline, fill = fill)
+                sprites[key] = (sprite, low)
+            sprite, low = sprites[key]
+            x = int(low[0] + (offset[0] - phase[0]) // phases)
+            y = int(low[1] + (offset[1] - phase[1]) // phases)
+            if x < img.size[0] and y < img.size[1] and x + sprite.size[0] > 0 and y + sprite.size[1] > 0:
+                img.paste(sprite, (x, y), sprite)
+
+    def levelColours(self):
+        '''
+        Calculates the fill colour of every level of the tree.
+
+        self: An object of the class Tree.
+        On exit: A list with order + 1 tuples has been returned, with the RGB colour of the
+                 squares of every level, going gradually from rootColour to branchColour.
         '''
-        img = Image.new("RGB", size, self.background[0])
-        draw = ImageDraw.Draw(img)
-        square = self.firstSquare(size)
-        listOfSquares = [square]
-        square.makeTree(self.angleL, self.angleR, self.order, listOfSquares)
         # Calculate gradiant step for the fill colour of the squares.
         colourStep = [0,0,0]
         if self.order != 0:
             colourStep = [(self.branchColour[0][i] - self.rootColour[0][i]) / float(self.order) for i in range(3)]
-        for i in range(self.order + 1):
-            fillColour = (int(self.rootColour[0][0] + colourStep[0] * i),
-                          int(self.rootColour[0][1] + colourStep[1] * i),
-                          int(self.rootColour[0][2] + colourStep[2] * i))
+        return [(int(self.rootColour[0][0] + colourStep[0] * i),
+                 int(self.rootColour[0][1] + colourStep[1] * i),
+                 int(self.rootColour[0][2] + colourStep[2] * i)) for i in range(self.order + 1)]
+
+    def paletteColours(self):
+        '''
+        Creates the palette for images drawn with level indices.
+
+        self: An object of the class Tree.
+        On exit: A list with the 768 values of a palette has been returned. Index 0 is the
+                 background, index i + 1 the fill colour of level i from levelColours(), and
+                 index order + 2 the outline colour if the tree has an outline.
+        '''
+        colours = [self.background[0]] + self.levelColours()
+        if self.outline[0] is not None:
+            colours.append(self.outline[0])
+        palette = []
+        for colour in colours:
+            palette.extend(colour)
+        return palette + [0] * (768 - len(palette))
+
+    def renderTree(self, size, colours, stream, cull, spriteDepth, spriteError, rasterize, antialias):
+        '''
+        Creates an image with the given colours and draws the squares of the tree on it.
+
+        self: An object of the class Tree.
+        size: The size of the image.
+        colours: A tuple with the background colour, a list with the fill colour of every level
+                 and the outline colour or None. The colours are either RGB tuples, for an "RGB"
+                 image, or integers, for an "L" image with one value for every colour.
+        stream, cull, spriteDepth, spriteError, rasterize, antialias: See drawTree(...).
+        On exit: The image has been created and the squares of every level drawn on it in the
+                 way chosen by the arguments, and the image is returned. If stream, the squares
+                 of every level have been drawn as they were yielded, so that the memory used
+                 does not grow with the number of squares. Otherwise, unless backend is
+                 "python", the squares are created level by level, and if it is with
+                 Square.makeTree(...), see selectBackend(...). The levels are taken from
+                 unitGeometry(...), so a tree that has only been moved, scaled or recoloured
+                 is not created again. With spriteDepth only the levels above the sprites are
+                 taken from geometryCache. If rasterize and workers is more than 1, the image is
+                 drawn by renderParallel(...) instead, unless antialias, stream, cull or
+                 spriteDepth is used.
+        '''
+        if (rasterize and self.workers > 1 and backend != "python" and not (stream or cull or antialias) and
+                spriteDepth is None):
+            return self.renderParallel(size, colours, self.workers)
+        background, levelColours, outlineColour = colours
+        mode = "RGB"
+        if isinstance(background, int):
+            mode = "L"
+        img = Image.new(mode, size, background)
+        draw = ImageDraw.Draw(img)
+        pixels = None
+        if stream or cull:
+            square = self.firstSquare(size)
+        elif backend != "python":
+            if spriteDepth is None:
+                geometry = self.unitGeometry()
+            else:
+                # Only the levels above the sprites are created, never the whole tree.
+                geometry = geometryCache.get(max(self.order - spriteDepth, 0), self.angleL, self.angleR,
+                                             self.workers, self.splitLevel)
+                sprites = {}
+            width, cornerx, cornery = self.placement(size)
+            if antialias:
+                pixels = numpy.array(img, dtype = numpy.float32)
+            elif rasterize:
+                pixels = numpy.array(img)
+        else:
+            square = self.firstSquare(size)
+            listOfSquares = [square]
+            square.makeTree(self.angleL, self.angleR, self.order, listOfSquares)
+            # Sort the squares by level in one pass, keeping the order they were created in.
+            levels = [[] for i in range(self.order + 1)]
             for j in listOfSquares:
-                if (j.order == i):
-                    j.drawSquare(draw,self.outline[0], fillColour)
+                levels[j.order].append(j)
+        for i in range(self.order + 1):
+            fillColour = levelColours[i]
+            if stream:
+                # One depth-first pass per level keeps the draw order of the other paths
+                # and creates only about twice as many squares as a single pass.
+                for j in square.iterTree(self.angleL, self.angleR, self.order, i):
+                    j.drawSquare(draw, outlineColour, fillColour)
+            elif cull:
+                for j in self.iterVisible(size, i):
+                    j.drawSquare(draw, outlineColour, fillColour)
+            elif backend != "python" and i > geometry.order:
+                if pixels is not None:
+                    img = Image.fromarray(numpy.around(pixels).astype(numpy.uint8))
+                    pixels = None
+                self.stampLevel(img, i, geometry, (width, cornerx, cornery), fillColour, outlineColour,
+                                spriteError, sprites)
+            elif backend != "python":
+                levelCorners = geometry.corners[i] * width + (cornerx, cornery)
+                # Skip the squares that are entirely outside the image.
+                low = levelCorners.min(1)
+                high = levelCorners.max(1)
+                inside = ((high[:, 0] >= 0) & (low[:, 0] <= size[0]) &
+                          (high[:, 1] >= 0) & (low[:, 1] <= size[1]))
+                if antialias:
+                    if not inside.any():
+                        continue
+                    low = numpy.maximum(numpy.floor(low[inside].min(0)) - 1, 0).astype(int)
+                    high = numpy.minimum(numpy.ceil(high[inside].max(0)) + 1, size).astype(int)
+                    box = (low[0], low[1], high[0], high[1])
+                    fill, edges = quadCoverage(levelCorners[inside], box, outlineColour is not None)
+                    blendCoverage(pixels, box, fill, fillColour)
+                    if edges is not None:
+                        blendCoverage(pixels, box, edges, outlineColour)
+                elif rasterize:
+                    # ImageDraw also draws the edges of a filled polygon, in the fill colour
+                    # unless there is an outline.
+                    fillQuads(pixels, levelCorners[inside], fillColour)
+                    edgeColour = fillColour
+                    if outlineColour is not None:
+                        edgeColour = outlineColour
+                    outlineQuads(pixels, levelCorners[inside], edgeColour)
+                else:
+                    for corners in levelCorners[inside].reshape(-1, 8).tolist():
+                        draw.polygon(corners, outline = outlineColour, fill = fillColour)
+            else:
+                for j in levels[i]:
+                    j.drawSquare(draw, outlineColour, fillColour)
+        if pixels is not None:
+            img = Image.fromarray(numpy.around(pixels).astype(numpy.uint8))
+        return img
+
+    def drawTree(self, size, save = False, name = "pythagorasTree", stream = False, cull = False,
+                 spriteDepth = None, spriteError = 0.5, autoFit = False, rasterize = False,
+                 antialias = False, palette = False):
+        '''
+        Creates an image and draws a tree on it.
+
+        self: An object of the class Tree.
+        size: The size of the image.
+        save: A boolean variable determining whether the image should be saved or not.
+        name: The name the image will have if saved.
+        stream: A boolean variable determining whether the squares should be created lazily with
+                Square.iterTree(...) while they are drawn, instead of being stored first.
+        cull: A boolean variable determining whether only the visible squares should be created,
+              using iterVisible(...). This skips subtrees outside the image and does not
+              subdivide squares smaller than a pixel, so deep zooms at high orders only cost
+              the detail that can be seen.
+        spriteDepth: If given, the squares that are more than this number of levels below the
+                     leaves of the tree are drawn with polygons, and the levels below them are
+                     drawn with stampLevel(...). Requires NumPy.
+        spriteError: The highest distance in pixels that a square drawn with stampLevel(...) may
+                     be moved from its exact position. The default 0.5 rounds the subtrees to
+                     whole pixels, smaller values draw more sprites. If spriteDepth is given and
+                     spriteError is not larger than 0, a ValueError is raised.
+        autoFit: A boolean variable determining whether the tree should be drawn as large as
+                 possible in the centre of the image, see fitToImage(...). The scale and the
+                 offset of the tree are restored afterwards.
+        rasterize: A boolean variable determining whether the squares of every level should be
+                   drawn together with fillQuads(...) and outlineQuads(...) on a NumPy array,
+                   instead of with one ImageDraw.polygon(...) call per square. The pixels on
+                   the edges of the squares can differ slightly from ImageDraw, and the outlines
+                   of a level are drawn after all its squares have been filled. Requires that
+                   backend is not "python". If workers is more than 1, the tiles of the image
+                   are drawn in parallel with renderParallel(...), with the same pixels.
+        antialias: A boolean variable determining whether the edges of the squares should be
+                   smoothed. The part of every pixel covered by the squares and outlines of a
+                   level is calculated with quadCoverage(...), and the colour of the level is
+                   blended in with blendCoverage(...), so the image is antialiased in a single
+                   pass at its own size. Requires that backend is not "python", and is not
+                   used with stream, cull or palette.
+        palette: A boolean variable determining whether the image should be a "P" image, with
+                 the level of every pixel as its index and paletteColours() as the palette.
+        On exit: An image with a pythagorean tree has been drawn with renderTree(...), using
+                 the attributes of the Tree object to define colours and the shape of the tree.
+                 The image is returned and if save the image has been saved. If palette, the
+                 image of level indices is kept in levelImage, and as long as only the colours
+                 of the tree change it is reused and only the palette is replaced. A "P" image
+                 is saved as it is, except as JPEG, which has no palettes, where it is first
+                 converted to "RGB".
+        '''
+        if spriteDepth is not None and spriteError <= 0:
+            raise ValueError("spriteError must be larger than 0, got %r" % spriteError)
+        if autoFit:
+            view = (self.scale, self.positionChangex, self.positionChangey)
+            self.fitToImage(size)
+            try:
+                return self.drawTree(size, save, name, stream, cull, spriteDepth, spriteError,
+                                     rasterize = rasterize, antialias = antialias, palette = palette)
+            finally:
+                self.scale, self.positionChangex, self.positionChangey = view
+        if palette:
+            settings = (tuple(size), self.order, self.angleL, self.angleR, self.scale,
+                        self.positionChangex, self.positionChangey, self.outline[0] is None,
+                        backend, stream, cull, spriteDepth, spriteError, rasterize)
+            if self.levelImage is None or self.levelImage[0] != settings:
+                outlineIndex = None
+                if self.outline[0] is not None:
+                    outlineIndex = self.order + 2
+                self.levelImage = (settings, self.renderTree(size, (0, range(1, self.order + 2), outlineIndex),
+                                                             stream, cull, spriteDepth, spriteError,
+                                                             rasterize, False))
+            img = self.levelImage[1].copy()
+            img.putpalette(self.paletteColours())
+        else:
+            img = self.renderTree(size, (self.background[0], self.levelColours(), self.outline[0]),
+                                  stream, cull, spriteDepth, spriteError, rasterize, antialias)
         if save:
-            img.save(name)
+            if img.mode == "P" and os.path.splitext(name)[1].lower() in (".jpg", ".jpeg"):
+                img.convert("RGB").save(name)
+            else:
+                img.save(name)
         return img
 
+    def drawTile(self, size, box, colours, minSide = 0, placement = None):
+        '''
+        Draws the part of the tree that lies in a rectangle of the image.
+
+        self: An object of the class Tree.
+        size: The size of the whole image.
+        box: A tuple with the smallest x, smallest y, largest x and largest y of the rectangle in
+             whole pixels. The largest values are not included.
+        colours: The colours of the tree, see renderTree(...).
+        minSide: The squares with a side in pixels smaller than this are drawn, but not their
+                 children. The default 0 draws every square.
+        placement: A tuple as returned by placement(...) to use instead of the one for size,
+                   for example to draw a smaller copy of the image.
+        On exit: An image of the rectangle has been returned, with the same pixels as the part
+                 of the whole image that drawTree(...) would draw with rasterize set to True.
+                 Only the squares that intersect the rectangle, found with the SquareIndex
+                 object of unitGeometry(...), have been drawn with fillQuads(...) and
+                 outlineQuads(...), in the same order as drawTree(...) draws them. ImageDraw is
+                 not used, since it rounds corners left of or above the image differently, which
+                 would show at the edges of the tiles.
+        '''
+        background, levelColours, outlineColour = colours
+        mode = "RGB"
+        if isinstance(background, int):
+            mode = "L"
+        pixels = numpy.array(Image.new(mode, (box[2] - box[0], box[3] - box[1]), background))
+        geometry = self.unitGeometry()
+        if placement is None:
+            placement = self.placement(size)
+        width, cornerx, cornery = placement
+        # One pixel of margin, since the squares are drawn with their corners truncated.
+        levels = geometry.makeIndex().query(((box[0] - 1 - cornerx) / width, (box[1] - 1 - cornery) / width,
+                                             (box[2] + 1 - cornerx) / width, (box[3] + 1 - cornery) / width),
+                                            minSide / width)
+        for i in range(len(levels)):
+            if len(levels[i]) == 0:
+                continue
+            # Place the squares as in drawTree(...) and let the rasterizer move them to the
+            # tile after truncating the corners, so that they are rounded in the same way.
+            levelCorners = geometry.corners[i][levels[i]] * width + (cornerx, cornery)
+            fillQuads(pixels, levelCorners, levelColours[i], box[:2])
+            edgeColour = levelColours[i]
+            if outlineColour is not None:
+                edgeColour = outlineColour
+            outlineQuads(pixels, levelCorners, edgeColour, box[:2])
+        return Image.fromarray(pixels)
+
+    def renderParallel(self, size, colours, workers, tileSize = 512):
+        '''
+        Creates an image and draws the squares of the tree on it in tiles, using a pool of processes.
+
+        self: An object of the class Tree.
+        size: The size of the image.
+        colours: The colours of the tree, see renderTree(...).
+        workers: The number of processes in the pool.
+        tileSize: The side of the tiles in pixels.
+        On exit: The image has been divided into tiles, which the pool has drawn with
+                 drawTile(...) and written by drawSharedTile(...) directly into an array in
+                 shared memory, so no pixels are sent back between the processes. The squares
+                 and their SquareIndex object are created in this process before the pool is
+                 started. The image is returned, with the same pixels as renderTree(...) draws
+                 in one process with rasterize set to True.
+        '''
+        bands = 3
+        if isinstance(colours[0], int):
+            bands = 1
+        self.unitGeometry().makeIndex()
+        buffer = multiprocessing.RawArray("B", size[0] * size[1] * bands)
+        tasks = []
+        for top in range(0, size[1], tileSize):
+            for left in range(0, size[0], tileSize):
+                tasks.append((left, top, min(left + tileSize, size[0]), min(top + tileSize, size[1])))
+        pool = multiprocessing.Pool(workers, initTileWorker, (self, size, colours, buffer))
+        try:
+            # The tiles take very different times, so they are handed out one at a time.
+            pool.map(drawSharedTile, tasks, 1)
+        finally:
+            pool.close()
+            pool.join()
+        pixels = numpy.frombuffer(buffer, dtype = numpy.uint8).reshape(size[1], size[0], bands)
+        if bands == 1:
+            pixels = pixels[:, :, 0]
+        return Image.fromarray(pixels)
+
+    def exportTiled(self, size, fileName, tileSize = 1024, palette = True, minSide = 0, autoFit = False):
+        '''
+        Saves a PNG image of the tree that is drawn and written one band of tiles at a time.
+
+        self: An object of the class Tree.
+        size: The size of the image.
+        fileName: The name of the PNG file.
+        tileSize: The side of the tiles in pixels. The memory used is about the width of the
+                  image times tileSize bytes for a palette image, and three times that for RGB.
+        palette: A boolean variable determining whether the image is saved with a palette,
+                 see drawTree(...), or as an RGB image.
+        minSide: See drawTile(...).
+        autoFit: See drawTree(...).
+        On exit: The image has been drawn as rows of tiles with drawTile(...). The tiles of
+                 one row are put together into a band, which has been passed to a PNGWriter
+                 object and then discarded, so the whole image is never in memory. The squares
+                 of the tree are created once, and every tile only draws the squares that
+                 intersect it. With the default minSide the file has the same pixels as the
+                 image drawTree(...) saves with rasterize set to True.
+        '''
+        if autoFit:
+            view = (self.scale, self.positionChangex, self.positionChangey)
+            self.fitToImage(size)
+            try:
+                return self.exportTiled(size, fileName, tileSize, palette, minSide)
+            finally:
+                self.scale, self.positionChangex, self.positionChangey = view
+        if palette:
+            outlineIndex = None
+            if self.outline[0] is not None:
+                outlineIndex = self.order + 2
+            colours = (0, range(1, self.order + 2), outlineIndex)
+            writer = PNGWriter(fileName, size, self.paletteColours()[:3 * (self.order + 3)])
+            mode = "L"
+        else:
+            colours = (self.background[0], self.levelColours(), self.outline[0])
+            writer = PNGWriter(fileName, size)
+            mode = "RGB"
+        for top in range(0, size[1], tileSize):
+            bottom = min(top + tileSize, size[1])
+            band = Image.new(mode, (size[0], bottom - top))
+            for left in range(0, size[0], tileSize):
+                band.paste(self.drawTile(size, (left, top, min(left + tileSize, size[0]), bottom),
+                                         colours, minSide), (left, 0))
+            writer.writeRows(numpy.asarray(band))
+        writer.close()
+
+    def exportPyramid(self, size, name, tileSize = 254, overlap = 1, fileFormat = "png", minSide = 1.0,
+                      resume = True, palette = True, autoFit = False):
+        '''
+        Saves the image of the tree as a Deep Zoom image, a pyramid of tiles for viewing on the web.
+
+        self: An object of the class Tree.
+        size: The size of the image at the highest resolution.
+        name: The name of the manifest without the extension. The manifest is saved as
+              name + ".dzi" and the tiles in the directory name + "_files".
+        tileSize: The side of the tiles in pixels, without the overlap.
+        overlap: The number of pixels every tile shares with its neighbours on each side.
+        fileFormat: The format of the tiles, "png" or "jpg".
+        minSide: See drawTile(...). With the default 1.0 the squares are not subdivided below
+                 one pixel at the level that is drawn.
+        resume: A boolean variable determining whether tiles that already exist should be kept.
+        palette: A boolean variable determining whether PNG tiles should be saved with a
+                 palette, see drawTree(...), or as RGB images.
+        autoFit: See drawTree(...).
+        On exit: Every level of the pyramid, from a single pixel up to size, has been divided
+                 into tiles, which have been drawn with drawTile(...) and saved as
+                 name + "_files/level/column_row.format", and the manifest has been written.
+                 Level k is the image scaled down by 2 ** (n - k), where n is the highest level.
+                 All levels share the squares and the SquareIndex object of unitGeometry(...),
+                 and every tile only draws the squares that intersect it. Every tile is saved
+                 under a temporary name and then renamed, so with resume an interrupted export
+                 can be continued without redrawing, or reading, the tiles already saved. The
+                 number of tiles drawn is returned.
+        '''
+        if autoFit:
+            view = (self.scale, self.positionChangex, self.positionChangey)
+            self.fitToImage(size)
+            try:
+                return self.exportPyramid(size, name, tileSize, overlap, fileFormat, minSide, resume, palette)
+            finally:
+                self.scale, self.positionChangex, self.positionChangey = view
+        pillowFormat = fileFormat.upper().replace("JPG", "JPEG")
+        if pillowFormat == "JPEG":
+            palette = False
+        if palette:
+            outlineIndex = None
+            if self.outline[0] is not None:
+                outlineIndex = self.order + 2
+            colours = (0, range(1, self.order + 2), outlineIndex)
+        else:
+            colours = (self.background[0], self.levelColours(), self.outline[0])
+        self.unitGeometry().makeIndex()
+        width, cornerx, cornery = self.placement(size)
+        maxLevel = int(math.ceil(math.log(max(size[0], size[1]), 2)))
+        drawn = 0
+        for level in range(maxLevel + 1):
+            factor = 2 ** (maxLevel - level)
+            levelSize = (-(-size[0] // factor), -(-size[1] // factor))
+            placement = (width / factor, cornerx / factor, cornery / factor)
+            directory = os.path.join(name + "_files", str(level))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            for row in range(-(-levelSize[1] // tileSize)):
+                for column in range(-(-levelSize[0] // tileSize)):
+                    fileName = os.path.join(directory, "%d_%d.%s" % (column, row, fileFormat))
+                    if resume and os.path.exists(fileName):
+                        continue
+                    box = (max(column * tileSize - overlap, 0), max(row * tileSize - overlap, 0),
+                           min((column + 1) * tileSize + overlap, levelSize[0]),
+                           min((row + 1) * tileSize + overlap, levelSize[1]))
+                    tile = self.drawTile(levelSize, box, colours, minSide, placement)
+                    if palette:
+                        tile.putpalette(self.paletteColours())
+                    tile.save(fileName + ".part", pillowFormat)
+                    if os.path.exists(fileName):
+                        os.remove(fileName)
+                    os.rename(fileName + ".part", fileName)
+                    drawn = drawn + 1
+        manifest = open(name + ".dzi", "w")
+        manifest.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                       '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="%d" Overlap="%d" '
+                       'Format="%s">\n  <Size Width="%d" Height="%d"/>\n</Image>\n'
+                       % (tileSize, overlap, fileFormat, size[0], size[1]))
+        manifest.close()
+        return drawn
+
+    def exportVector(self, size, fileName, minSide = 0, decimals = 1, autoFit = False):
+        '''
+        Saves the tree as an SVG or a PDF file, writing the squares level by level as they are found.
+
+        self: An object of the class Tree.
+        size: The size of the drawing in pixels. In a PDF file a pixel is one point, 1/72 inch.
+        fileName: The name of the file. A PDF file is written if it ends with ".pdf", and an
+                  SVG file otherwise.
+        minSide: The squares with a side in pixels smaller than this are written, but not their
+                 children. For a print, this can be the size of a printer dot, for example
+                 72 / 600.0 for a PDF printed at 600 dots per inch. The default 0 writes every
+                 square that can be seen.
+        decimals: The number of decimals the coordinates are rounded to.
+        autoFit: See drawTree(...).
+        On exit: The squares of every level that lie in the drawing have been written with an
+                 SVGWriter or a PDFWriter object as one group per level that shares the colours
+                 of the level, in chunks of at most 65536 squares, and the file only grows with
+                 the detail that can be seen. The squares are found with iterVisible(...) one
+                 at a time, so the memory used does not grow with the order of the tree. Only
+                 when minSide is 0, backend is not "python" and the whole tree fits in
+                 geometryCache are they found with the SquareIndex object of unitGeometry(...)
+                 instead, which holds every square of the tree.
+                 The outlines of a level are painted after all its squares have been filled.
+                 The number of squares written is returned.
+        '''
+        if autoFit:
+            view = (self.scale, self.positionChangex, self.positionChangey)
+            self.fitToImage(size)
+            try:
+                return self.exportVector(size, fileName, minSide, decimals)
+            finally:
+                self.scale, self.positionChangex, self.positionChangey = view
+        unit = 10 ** decimals
+        if os.path.splitext(fileName)[1].lower() == ".pdf":
+            writer = PDFWriter(fileName, size, self.background[0], unit)
+        else:
+            writer = SVGWriter(fileName, size, self.background[0], unit)
+        levelColours = self.levelColours()
+        indexed = (backend != "python" and minSide == 0 and
+                   2 ** (self.order + 1) - 1 <= geometryCache.maxSquares)
+        if indexed:
+            geometry = self.unitGeometry()
+            width, cornerx, cornery = self.placement(size)
+            levels = geometry.makeIndex().query((-cornerx / width, -cornery / width, (size[0] - cornerx) / width,
+                                                 (size[1] - cornery) / width), minSide / width)
+        written = 0
+        for i in range(self.order + 1):
+            writer.beginLevel(levelColours[i], self.outline[0])
+            if indexed:
+                for start in range(0, len(levels[i]), 65536):
+                    corners = geometry.corners[i][levels[i][start:start + 65536]] * width + (cornerx, cornery)
+                    writer.writeSquares(numpy.around(corners * unit).astype(numpy.int64).ravel().tolist())
+                written = written + len(levels[i])
+            else:
+                points = []
+                for j in self.iterVisible(size, i, minSide):
+                    for x, y in j.corners:
+                        points.extend((int(round(x * unit)), int(round(y * unit))))
+                    if len(points) == 8 * 65536:
+                        writer.writeSquares(points)
+                        written = written + 65536
+                        points = []
+                if points:
+                    writer.writeSquares(points)
+                    written = written + len(points) // 8
+            writer.endLevel()
+        writer.close()
+        return written
+
+    def animate(self, size, timeline, fileName = None, pipe = None, delay = 40, workers = 1):
+        '''
+        Draws a sequence of frames where the angles, the scale or the offset of the tree change.
+
+        self: An object of the class Tree.
+        size: The size of the frames.
+        timeline: A list with one dictionary of settings for every frame, see
+                  FrameRenderer.render(...) and interpolateTimeline(...).
+        fileName: If given, the frames are saved as an animated PNG file with this name.
+        pipe: If given, a binary file object, for example the input of a video encoder, that
+              the frames are written to as raw RGB pixels, width * height * 3 bytes per frame.
+        delay: The time every frame of the animated PNG is shown, in milliseconds.
+        workers: The number of processes drawing the frames.
+        On exit: Every frame has been drawn by a FrameRenderer object, which creates the
+                 squares once and reuses them and the image for all its frames, and written
+                 in order to the file and the pipe as soon as it was ready. If workers is more
+                 than 1, the frames are drawn in parallel by a pool of processes with their
+                 own FrameRenderer objects, and imap(...) returns them in the order of the
+                 timeline. The palette is the same for all frames, see paletteColours(), and
+                 the Tree object is not changed. The number of frames is returned. If drawing
+                 or writing a frame fails, the pool is terminated without drawing the rest of
+                 the frames and the unfinished file is removed before the error is raised.
+        '''
+        palette = self.paletteColours()
+        writer = None
+        if fileName is not None:
+            writer = PNGWriter(fileName, size, palette[:3 * (self.order + 3)], frames = len(timeline))
+        colours = numpy.array(palette, dtype = numpy.uint8).reshape(256, 3)
+        if workers > 1:
+            pool = multiprocessing.Pool(workers, initFrameWorker, (self, size))
+            frames = pool.imap(renderSharedFrame, timeline)
+        else:
+            pool = None
+            renderer = FrameRenderer(self, size)
+            frames = (renderer.render(settings) for settings in timeline)
+        finished = False
+        try:
+            for pixels in frames:
+                if writer is not None:
+                    writer.writeFrame(pixels, delay)
+                if pipe is not None:
+                    pipe.write(colours[pixels].tobytes())
+            finished = True
+        finally:
+            if pool is not None:
+                if finished:
+                    pool.close()
+                else:
+                    # Do not wait for the frames that are still being drawn.
+                    pool.terminate()
+                pool.join()
+            if writer is not None:
+                if finished:
+                    writer.close()
+                else:
+                    writer.file.close()
+                    os.remove(fileName)
+        return len(timeline)
+
 def matrixMultiplication(matrix1, matrix2):
     '''
     Multiplies two matrices.
@@ -340,6 +2470,555 @@ def matrixMultiplication(matrix1, matrix2):
                 resultMatrix[j][i] = resultMatrix[j][i] + matrix1[k][i] * matrix2[j][k]
     return resultMatrix
 
+def subtreeRadii(leftAngle, rightAngle, depth):
+    '''
+    Calculates how far the squares of a subtree can reach from the centre of its root square.
+
+    leftAngle: The angle the left child of a square is rotated relative to its parent.
+    rightAngle: The angle the right child of a square is rotated relative to its parent.
+    depth: The highest number of levels below the root square.
+    On exit: A list with depth + 1 elements has been returned, where element d is the radius
+             of a circle around the centre of a square that contains all squares at most d
+             levels below it. The radius is given in units of the side of the square.
+    '''
+    base = math.sin(math.radians(180 - (leftAngle + rightAngle)))
+    leftRatio = math.sin(math.radians(rightAngle)) / base
+    rightRatio = math.sin(math.radians(leftAngle)) / base
+    # Distance from the centre of a square with side 1 to the centres of its children.
+    left = math.radians(-leftAngle)
+    leftx = leftRatio * (0.5 * math.cos(left) + 0.5 * math.sin(left))
+    lefty = -1 + leftRatio * (0.5 * math.sin(left) - 0.5 * math.cos(left))
+    leftDistance = math.sqrt((leftx - 0.5) ** 2 + (lefty + 0.5) ** 2)
+    right = math.radians(rightAngle)
+    rightx = 1 + rightRatio * (-0.5 * math.cos(right) + 0.5 * math.sin(right))
+    righty = -1 + rightRatio * (-0.5 * math.sin(right) - 0.5 * math.cos(right))
+    rightDistance = math.sqrt((rightx - 0.5) ** 2 + (righty + 0.5) ** 2)
+    radii = [math.sqrt(0.5)]
+    for i in range(depth):
+        radii.append(max(radii[0], leftDistance + leftRatio * radii[-1],
+                         rightDistance + rightRatio * radii[-1]))
+    return radii
+
+def treeExtent(leftAngle, rightAngle, order):
+    '''
+    Calculates the bounding box of a tree without creating its squares.
+
+    leftAngle: The angle the left child of a square is rotated relative to its parent.
+    rightAngle: The angle the right child of a square is rotated relative to its parent.
+    order: The order of the tree.
+    On exit: A tuple with the smallest x, smallest y, largest x and largest y of the tree has
+             been returned, for a root square with side 1 whose lower left corner is at the
+             origin, as in GeometryCache. A square reached with a left turns out of m has the
+             side leftRatio ** a * rightRatio ** (m - a) and the angle -a * leftAngle +
+             (m - a) * rightAngle, so all such subtrees are translated copies of each other.
+             Their boxes have been calculated once for every (m, a), from the leaves up,
+             which takes time proportional to order ** 2.
+    '''
+    base = math.sin(math.radians(180 - (leftAngle + rightAngle)))
+    leftRatio = math.sin(math.radians(rightAngle)) / base
+    rightRatio = math.sin(math.radians(leftAngle)) / base
+    boxes = []
+    for m in range(order, -1, -1):
+        levelBoxes = []
+        for a in range(m + 1):
+            side = leftRatio ** a * rightRatio ** (m - a)
+            angle = math.radians(-a * leftAngle + (m - a) * rightAngle)
+            ux, uy = side * math.cos(angle), side * math.sin(angle)
+            # The corners relative to the lower left corner, see TreeGeometry.addLevel().
+            xs = [0, ux, ux + uy, uy]
+            ys = [0, uy, uy - ux, -ux]
+            box = [min(xs), min(ys), max(xs), max(ys)]
+            if m < order:
+                rightAngleSum = angle + math.radians(rightAngle)
+                rightSide = side * rightRatio
+                children = ((uy, -ux, boxes[a + 1]),
+                            (ux + uy - rightSide * math.cos(rightAngleSum),
+                             uy - ux - rightSide * math.sin(rightAngleSum), boxes[a]))
+                for x, y, childBox in children:
+                    box = [min(box[0], x + childBox[0]), min(box[1], y + childBox[1]),
+                           max(box[2], x + childBox[2]), max(box[3], y + childBox[3])]
+            levelBoxes.append(box)
+        boxes = levelBoxes
+    return tuple(boxes[0])
+
+def fillQuads(pixels, quads, colour, origin = (0, 0)):
+    '''
+    Fills a batch of convex quadrilaterals in an image array, one span per row of each quadrilateral.
+
+    pixels: A NumPy array of shape (height, width, 3) with the image, or (height, width) for an
+            image with one band.
+    quads: An array of shape (n, 4, 2) with the corners of the quadrilaterals in pixels.
+    colour: The colour of the quadrilaterals, a tuple for three bands and a number for one.
+    origin: A tuple with the whole pixel coordinates of the upper left corner of pixels, when
+            the array only holds a part of the image that the corners refer to.
+    On exit: Every pixel whose coordinates lie inside one of the quadrilaterals has been set to
+             the colour. The corners are truncated to whole pixels, as ImageDraw does. For every
+             row of every quadrilateral the span between the leftmost and the rightmost crossing
+             of an edge is found with array operations, and the spans are written in chunks of
+             at most 2 ** 22 pixels, so the time depends on the area that is filled and not on
+             the number of calls.
+    '''
+    height, width = pixels.shape[:2]
+    xs = numpy.floor(quads[:, :, 0]) - origin[0]
+    ys = numpy.floor(quads[:, :, 1]) - origin[1]
+    top = numpy.maximum(ys.min(1), 0).astype(numpy.int64)
+    bottom = numpy.minimum(ys.max(1), height - 1).astype(numpy.int64)
+    counts = numpy.maximum(bottom - top + 1, 0)
+    # One element for every row of every quadrilateral.
+    rowQuads = numpy.repeat(numpy.arange(len(quads)), counts)
+    rows = (numpy.arange(len(rowQuads)) -
+            numpy.repeat(numpy.cumsum(counts) - counts - top, counts)).astype(numpy.float64)
+    low = numpy.full(len(rows), numpy.inf)
+    high = numpy.full(len(rows), -numpy.inf)
+    for k in range(4):
+        x0 = xs[:, k][rowQuads]
+        y0 = ys[:, k][rowQuads]
+        x1 = xs[:, (k + 1) % 4][rowQuads]
+        y1 = ys[:, (k + 1) % 4][rowQuads]
+        dy = y1 - y0
+        crosses = (numpy.minimum(y0, y1) <= rows) & (rows <= numpy.maximum(y0, y1)) & (dy != 0)
+        dy[~crosses] = numpy.inf
+        x = x0 + (rows - y0) * (x1 - x0) / dy
+        x[~crosses] = numpy.nan
+        numpy.fmin(low, x, out = low)
+        numpy.fmax(high, x, out = high)
+    left = numpy.maximum(numpy.ceil(low), 0)
+    right = numpy.minimum(numpy.floor(high), width - 1)
+    spans = left <= right
+    left = left[spans].astype(numpy.int64)
+    starts = rows[spans].astype(numpy.int64) * width + left
+    lengths = right[spans].astype(numpy.int64) - left + 1
+    flat = pixels.reshape(height * width, -1)
+    ends = numpy.cumsum(lengths)
+    first = 0
+    while first < len(lengths):
+        last = max(int(numpy.searchsorted(ends, ends[first] - lengths[first] + 2 ** 22, "right")), first + 1)
+        chunk = lengths[first:last]
+        flat[numpy.arange(chunk.sum()) - numpy.repeat(numpy.cumsum(chunk) - chunk - starts[first:last], chunk)] = colour
+        first = last
+
+def outlineQuads(pixels, quads, colour, origin = (0, 0)):
+    '''
+    Draws the edges of a batch of quadrilaterals in an image array.
+
+    pixels: See fillQuads(...).
+    quads: An array of shape (n, 4, 2) with the corners of the quadrilaterals in pixels.
+    colour: The colour of the edges, see fillQuads(...).
+    origin: See fillQuads(...).
+    On exit: The four edges of every quadrilateral have been drawn one pixel wide, between the
+             corners truncated to whole pixels. Every edge is sampled once per pixel along its
+             longest axis, and all samples of the batch are rounded and written at once.
+    '''
+    height, width = pixels.shape[:2]
+    x0 = numpy.floor(quads[:, :, 0]).ravel()
+    y0 = numpy.floor(quads[:, :, 1]).ravel()
+    dx = numpy.floor(numpy.roll(quads[:, :, 0], -1, axis = 1)).ravel() - x0
+    dy = numpy.floor(numpy.roll(quads[:, :, 1], -1, axis = 1)).ravel() - y0
+    x0 -= origin[0]
+    y0 -= origin[1]
+    lengths = numpy.maximum(numpy.abs(dx), numpy.abs(dy))
+    counts = lengths.astype(numpy.int64) + 1
+    edges = numpy.repeat(numpy.arange(len(x0)), counts)
+    fractions = (numpy.arange(len(edges)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)) / \
+                numpy.maximum(lengths, 1)[edges]
+    x = numpy.floor(x0[edges] + dx[edges] * fractions + 0.5).astype(numpy.int64)
+    y = numpy.floor(y0[edges] + dy[edges] * fractions + 0.5).astype(numpy.int64)
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    pixels.reshape(height * width, -1)[(y * width + x)[inside]] = colour
+
+def quadCoverage(quads, box, outline = False):
+    '''
+    Calculates how much of every pixel in a rectangle is covered by a batch of squares.
+
+    quads: An array of shape (n, 4, 2) with the corners of the squares in pixels, in the order
+           of Square.corners.
+    box: A tuple with the smallest x, smallest y, largest x and largest y of the rectangle, in
+         whole pixels. The largest values are not included.
+    outline: A boolean variable determining whether the coverage of the outlines should also be
+             calculated.
+    On exit: A tuple with two arrays of shape (height, width) of the rectangle has been returned.
+             The first contains the part of every pixel covered by the squares, and the second
+             the part covered by one pixel wide outlines centred on their edges, or None if not
+             outline. For every pixel near a square, the signed distances from the centre of
+             the pixel to the four edges are calculated. The coverage along each side of the
+             square is the overlap of the pixel with the square in that direction, which is
+             exact for squares parallel to the axes and also correct for squares smaller than
+             a pixel, and the coverage is the product of the two. The coverage of the squares
+             is added up, so that squares sharing an edge leave no seam, and limited to 1.
+             The pixels are processed in chunks of at most 2 ** 22.
+    '''
+    width = box[2] - box[0]
+    height = box[3] - box[1]
+    fill = numpy.zeros(width * height)
+    edges = None
+    if outline:
+        edges = numpy.zeros(width * height)
+    if width <= 0 or height <= 0 or len(quads) == 0:
+        if outline:
+            edges = edges.reshape(height, width)
+        return fill.reshape(height, width), edges
+    # The pixels that can be touched by a square or its outline.
+    left = numpy.clip(numpy.floor(quads[:, :, 0].min(1)) - 1, box[0], box[2]).astype(numpy.int64)
+    right = numpy.clip(numpy.floor(quads[:, :, 0].max(1)) + 2, box[0], box[2]).astype(numpy.int64)
+    top = numpy.clip(numpy.floor(quads[:, :, 1].min(1)) - 1, box[1], box[3]).astype(numpy.int64)
+    bottom = numpy.clip(numpy.floor(quads[:, :, 1].max(1)) + 2, box[1], box[3]).astype(numpy.int64)
+    columns = right - left
+    counts = columns * (bottom - top)
+    # The unit normal pointing into the square and the offset of every edge.
+    edgex = numpy.roll(quads[:, :, 0], -1, axis = 1) - quads[:, :, 0]
+    edgey = numpy.roll(quads[:, :, 1], -1, axis = 1) - quads[:, :, 1]
+    lengths = numpy.maximum(numpy.hypot(edgex, edgey), 1e-12)
+    normalx = edgey / lengths
+    normaly = -edgex / lengths
+    offsets = normalx * quads[:, :, 0] + normaly * quads[:, :, 1]
+    ends = numpy.cumsum(counts)
+    first = 0
+    while first < len(quads):
+        last = max(int(numpy.searchsorted(ends, ends[first] - counts[first] + 2 ** 22, "right")), first + 1)
+        chunk = counts[first:last]
+        pixelQuads = numpy.repeat(numpy.arange(first, last), chunk)
+        steps = numpy.arange(chunk.sum()) - numpy.repeat(numpy.cumsum(chunk) - chunk, chunk)
+        rows, cols = numpy.divmod(steps, columns[pixelQuads])
+        x = left[pixelQuads] + cols
+        y = top[pixelQuads] + rows
+        centrex = x + 0.5
+        centrey = y + 0.5
+        distances = (normalx[pixelQuads] * centrex[:, None] + normaly[pixelQuads] * centrey[:, None] -
+                     offsets[pixelQuads])
+        half = numpy.minimum(distances, 0.5)
+        coverage = (numpy.clip(half[:, 0] + half[:, 2], 0, 1) * numpy.clip(half[:, 1] + half[:, 3], 0, 1))
+        index = (y - box[1]) * width + (x - box[0])
+        fill += numpy.bincount(index, coverage, len(fill))
+        if outline:
+            edges += numpy.bincount(index, numpy.clip(1 - numpy.abs(distances.min(1)), 0, 1), len(edges))
+        first = last
+    numpy.minimum(fill, 1, out = fill)
+    if outline:
+        edges = numpy.minimum(edges, 1).reshape(height, width)
+    return fill.reshape(height, width), edges
+
+def blendCoverage(pixels, box, coverage, colour):
+    '''
+    Blends a colour into a part of an image array in proportion to the coverage of every pixel.
+
+    pixels: A NumPy array of shape (height, width, 3) with floating point values.
+    box: A tuple with the smallest x, smallest y, largest x and largest y of the part.
+    coverage: An array with the shape of the part, see quadCoverage(...).
+    colour: A tuple with the RGB colour that is blended in.
+    On exit: Every pixel in the part has been moved towards the colour by its coverage, so that
+             a pixel covered to a quarter keeps three quarters of its old colour.
+    '''
+    part = pixels[box[1]:box[3], box[0]:box[2]]
+    part += (numpy.array(colour, dtype = numpy.float32) - part) * coverage[:, :, None].astype(numpy.float32)
+
+def saveGeometry(geometry, fileName, dtype = "float64"):
+    '''
+    Writes a TreeGeometry object to a geometry file.
+
+    geometry: The TreeGeometry object that will be written.
+    fileName: The name of the file.
+    dtype: "float64" or "float32", the type used for the coordinates in the file.
+    On exit: The file has been written. It starts with a header of 64 bytes containing
+             the text "PYTREE", the format version (1), the size in bytes of the values
+             (8 or 4), the order, the angles and the number of squares. The header is
+             followed by the index of the first square of every level and one past the
+             last square as order + 2 unsigned 64 bit integers, and then by the flat arrays
+             of corners (8 values per square), angles and sides. All numbers are little endian.
+    '''
+    dtype = numpy.dtype(dtype).newbyteorder("<")
+    squareCount = 2 ** (geometry.order + 1) - 1
+    levelIndex = numpy.array([2 ** i - 1 for i in range(geometry.order + 2)], dtype = "<u8")
+    with open(fileName, "wb") as geometryFile:
+        header = struct.pack("<6sHIIddQ", b"PYTREE", 1, dtype.itemsize, geometry.order,
+                             geometry.leftAngle, geometry.rightAngle, squareCount)
+        geometryFile.write(header + b"\0" * (64 - len(header)))
+        geometryFile.write(levelIndex.tobytes())
+        for levels in (geometry.corners, geometry.angles, geometry.sides):
+            for level in levels:
+                geometryFile.write(numpy.ascontiguousarray(level, dtype = dtype).tobytes())
+
+def loadGeometry(fileName):
+    '''
+    Opens a geometry file as a TreeGeometry object without reading the arrays into memory.
+
+    fileName: The name of a file written by saveGeometry(...).
+    On exit: The arrays of the file have been mapped into memory with numpy.memmap and a
+             TreeGeometry object whose levels are read-only views of them has been
+             returned. Levels added to the object later are kept in memory only. If the
+             file is not a geometry file a ValueError has been raised.
+    '''
+    with open(fileName, "rb") as geometryFile:
+        header = geometryFile.read(64)
+    if len(header) < 64 or header[:6] != b"PYTREE":
+        raise ValueError("%s is not a geometry file" % fileName)
+    magic, version, itemsize, order, leftAngle, rightAngle, squareCount = \
+           struct.unpack("<6sHIIddQ", header[:struct.calcsize("<6sHIIddQ")])
+    if version != 1:
+        raise ValueError("%s has an unknown geometry format version" % fileName)
+    dtype = numpy.dtype("<f%d" % itemsize)
+    offset = 64
+    levelIndex = numpy.memmap(fileName, "<u8", "r", offset, (order + 2,))
+    offset = offset + 8 * (order + 2)
+    corners = numpy.memmap(fileName, dtype, "r", offset, (squareCount, 4, 2))
+    offset = offset + 8 * itemsize * squareCount
+    angles = numpy.memmap(fileName, dtype, "r", offset, (squareCount,))
+    offset = offset + itemsize * squareCount
+    sides = numpy.memmap(fileName, dtype, "r", offset, (squareCount,))
+    geometry = TreeGeometry([(0, 0), (1, 0), (1, -1), (0, -1)], leftAngle, rightAngle)
+    geometry.corners = []
+    geometry.angles = []
+    geometry.sides = []
+    for i in range(order + 1):
+        start, stop = int(levelIndex[i]), int(levelIndex[i + 1])
+        geometry.corners.append(corners[start:stop])
+        geometry.angles.append(angles[start:stop])
+        geometry.sides.append(sides[start:stop])
+    geometry.order = order
+    return geometry
+
+def initGeometryWorker(buffers):
+    '''
+    Stores the shared output arrays in a process of the pool used by TreeGeometry.growParallel(...).
+
+    buffers: A tuple with the shared arrays for the corners, the angles and the sides.
+    On exit: The arrays have been stored in the global variable sharedGeometry as NumPy arrays
+             that use the shared memory.
+    '''
+    global sharedGeometry
+    sharedGeometry = (numpy.frombuffer(buffers[0]).reshape(-1, 4, 2),
+                      numpy.frombuffer(buffers[1]), numpy.frombuffer(buffers[2]))
+
+def growSubtrees(task):
+    '''
+    Creates the deeper levels of a range of subtrees and writes them to the shared arrays.
+
+    task: A tuple with the left and the right angle, the split level, the order of the tree,
+          the index of the first subtree in the split level, and the corners, angles and sides
+          of the roots of the subtrees.
+    On exit: The levels below the roots, down to the order of the tree, have been created one
+             at a time with TreeGeometry.addLevel() and written to their place in sharedGeometry.
+             Only the newest level is kept in the memory of the process.
+    '''
+    leftAngle, rightAngle, splitLevel, order, start, corners, angles, sides = task
+    geometry = TreeGeometry(corners[0], leftAngle, rightAngle)
+    geometry.corners = [corners]
+    geometry.angles = [angles]
+    geometry.sides = [sides]
+    offset = 0
+    for i in range(splitLevel + 1, order + 1):
+        geometry.addLevel()
+        first = offset + start * 2 ** (i - splitLevel)
+        count = len(geometry.sides[-1])
+        sharedGeometry[0][first:first + count] = geometry.corners[-1]
+        sharedGeometry[1][first:first + count] = geometry.angles[-1]
+        sharedGeometry[2][first:first + count] = geometry.sides[-1]
+        geometry.corners = geometry.corners[-1:]
+        geometry.angles = geometry.angles[-1:]
+        geometry.sides = geometry.sides[-1:]
+        offset = offset + 2 ** i
+
+def initTileWorker(tree, size, colours, buffer):
+    '''
+    Stores the tree and the shared image array in a process of the pool used by Tree.renderParallel(...).
+
+    tree: The Tree object that is drawn.
+    size: The size of the image.
+    colours: The colours of the tree, see Tree.renderTree(...).
+    buffer: The shared array for the pixels of the image.
+    On exit: The arguments have been stored in the global variable sharedTile, with the shared
+             array as a NumPy array of shape (height, width, bands) that uses the shared memory.
+    '''
+    global sharedTile
+    sharedTile = (tree, size, colours,
+                  numpy.frombuffer(buffer, dtype = numpy.uint8).reshape(size[1], size[0], -1))
+
+def drawSharedTile(box):
+    '''
+    Draws one tile of the image in sharedTile.
+
+    box: A tuple with the smallest x, smallest y, largest x and largest y of the tile in whole
+         pixels. The largest values are not included.
+    On exit: The tile has been drawn with Tree.drawTile(...) and copied to its place in the
+             shared image array.
+    '''
+    tree, size, colours, pixels = sharedTile
+    tile = numpy.asarray(tree.drawTile(size, box, colours))
+    pixels[box[1]:box[3], box[0]:box[2]] = tile.reshape(box[3] - box[1], box[2] - box[0], -1)
+
+def initFrameWorker(tree, size):
+    '''
+    Creates the FrameRenderer object of a process drawing the frames of Tree.animate(...).
+
+    tree: The Tree object that is animated.
+    size: The size of the frames.
+    On exit: A FrameRenderer object has been stored in the global variable sharedFrames.
+    '''
+    global sharedFrames
+    sharedFrames = FrameRenderer(tree, size)
+
+def renderSharedFrame(settings):
+    '''
+    Draws one frame with the FrameRenderer object in sharedFrames.
+
+    settings: See FrameRenderer.render(...).
+    On exit: The array with the level index of every pixel of the frame has been returned.
+    '''
+    return sharedFrames.render(settings)
+
+def interpolateTimeline(start, stop, frameCount):
+    '''
+    Creates a timeline for Tree.animate(...) that changes settings evenly between two values.
+
+    start: A dictionary with the settings of the first frame, see FrameRenderer.render(...).
+    stop: A dictionary with the settings of the last frame, with the same keys as start.
+    frameCount: The number of frames, at least 2.
+    On exit: A list with frameCount dictionaries has been returned, where every setting
+             changes linearly from its value in start to its value in stop.
+    '''
+    timeline = []
+    for i in range(frameCount):
+        t = i / float(frameCount - 1)
+        timeline.append(dict((name, start[name] + (stop[name] - start[name]) * t) for name in start))
+    return timeline
+
+def childCorners(parents, leftRatio, rightRatio, leftTurn, rightTurn):
+    '''
+    Calculates the corners of the children of a level of squares with NumPy array operations.
+
+    parents: An array of shape (n, 4, 2) with the corners of the squares, see Square.corners.
+    leftRatio: The side of a left child divided by the side of its parent.
+    rightRatio: The side of a right child divided by the side of its parent.
+    leftTurn: Tuple with the cosine and sine of the rotation from a square to its left child.
+    rightTurn: Tuple with the cosine and sine of the rotation from a square to its right child.
+    On exit: An array of shape (n, 2, 4, 2) with the corners of the left and the right child of
+             every parent has been returned. The children are built from the base edge of the
+             parent, so no trigonometric functions are evaluated per square.
+    '''
+    count = len(parents)
+    # The base edge of every parent, from its lower left to its lower right corner.
+    edgex = parents[:, 1, 0] - parents[:, 0, 0]
+    edgey = parents[:, 1, 1] - parents[:, 0, 1]
+    children = numpy.empty((count, 2, 4, 2))
+
+    # Left children are rotated -angleL around the upper left corner of the parent.
+    cosine, sine = leftTurn
+    ux = leftRatio * (edgex * cosine + edgey * sine)
+    uy = leftRatio * (edgey * cosine - edgex * sine)
+    children[:, 0, 0] = parents[:, 3]
+    children[:, 0, 1, 0] = parents[:, 3, 0] + ux
+    children[:, 0, 1, 1] = parents[:, 3, 1] + uy
+    children[:, 0, 2, 0] = parents[:, 3, 0] + ux + uy
+    children[:, 0, 2, 1] = parents[:, 3, 1] + uy - ux
+    children[:, 0, 3, 0] = parents[:, 3, 0] + uy
+    children[:, 0, 3, 1] = parents[:, 3, 1] - ux
+
+    # Right children are rotated angleR around the upper right corner of the parent.
+    cosine, sine = rightTurn
+    ux = rightRatio * (edgex * cosine - edgey * sine)
+    uy = rightRatio * (edgey * cosine + edgex * sine)
+    children[:, 1, 0, 0] = parents[:, 2, 0] - ux
+    children[:, 1, 0, 1] = parents[:, 2, 1] - uy
+    children[:, 1, 1] = parents[:, 2]
+    children[:, 1, 2, 0] = parents[:, 2, 0] + uy
+    children[:, 1, 2, 1] = parents[:, 2, 1] - ux
+    children[:, 1, 3, 0] = parents[:, 2, 0] - ux + uy
+    children[:, 1, 3, 1] = parents[:, 2, 1] - uy - ux
+    return children
+
+def childCornersLoop(parents, leftRatio, rightRatio, leftCos, leftSin, rightCos, rightSin, children):
+    '''
+    Calculates the corners of the children of a level of squares one square at a time.
+
+    parents: See childCorners(...).
+    leftRatio: See childCorners(...).
+    rightRatio: See childCorners(...).
+    leftCos, leftSin: The cosine and sine of the rotation from a square to its left child.
+    rightCos, rightSin: The cosine and sine of the rotation from a square to its right child.
+    children: An array of shape (n, 2, 4, 2) that the corners are written to.
+    On exit: children has been filled with the same values as childCorners(...) returns.
+             The procedure only uses loops and arithmetic on scalars, so that selectBackend(...)
+             can compile it with Numba, which avoids the temporary arrays of the NumPy version.
+    '''
+    for i in range(parents.shape[0]):
+        edgex = parents[i, 1, 0] - parents[i, 0, 0]
+        edgey = parents[i, 1, 1] - parents[i, 0, 1]
+        x = parents[i, 3, 0]
+        y = parents[i, 3, 1]
+        ux = leftRatio * (edgex * leftCos + edgey * leftSin)
+        uy = leftRatio * (edgey * leftCos - edgex * leftSin)
+        children[i, 0, 0, 0] = x
+        children[i, 0, 0, 1] = y
+        children[i, 0, 1, 0] = x + ux
+        children[i, 0, 1, 1] = y + uy
+        children[i, 0, 2, 0] = x + ux + uy
+        children[i, 0, 2, 1] = y + uy - ux
+        children[i, 0, 3, 0] = x + uy
+        children[i, 0, 3, 1] = y - ux
+        x = parents[i, 2, 0]
+        y = parents[i, 2, 1]
+        ux = rightRatio * (edgex * rightCos - edgey * rightSin)
+        uy = rightRatio * (edgey * rightCos + edgex * rightSin)
+        children[i, 1, 0, 0] = x - ux
+        children[i, 1, 0, 1] = y - uy
+        children[i, 1, 1, 0] = x
+        children[i, 1, 1, 1] = y
+        children[i, 1, 2, 0] = x + uy
+        children[i, 1, 2, 1] = y - ux
+        children[i, 1, 3, 0] = x - ux + uy
+        children[i, 1, 3, 1] = y - uy - ux
+
+def fastestBackend():
+    '''
+    Finds the fastest backend that can be imported.
+
+    On exit: "numba" has been returned if Numba is installed, otherwise "numpy" if NumPy is
+             installed, and otherwise "python".
+    '''
+    if numba is not None:
+        return "numba"
+    if numpy is not None:
+        return "numpy"
+    return "python"
+
+def selectBackend(name = None):
+    '''
+    Chooses the implementation used for creating the squares of the tree.
+
+    name: One of "python", "numpy" and "numba", or None. With None the environment variable
+          PYTHAGORAS_BACKEND is used if it is set, and otherwise fastestBackend(). When the
+          module is imported an unusable PYTHAGORAS_BACKEND only gives a warning, and
+          fastestBackend() is used instead.
+    On exit: The global variable backend has been set to the name of the backend, which is
+             returned. With "python", Tree.drawTree(...) creates the squares with
+             Square.makeTree(...) and Square.rotateSquare(...), the reference implementation
+             that needs no other modules. With "numpy" the levels are created by
+             TreeGeometry.addLevel() with childCorners(...), and with "numba" with
+             childCornersLoop(...) compiled by Numba and stored in compiledKernels.
+             A ValueError has been raised if the backend is unknown or cannot be imported.
+    '''
+    global backend
+    if name is None:
+        name = os.environ.get("PYTHAGORAS_BACKEND")
+    if name is None:
+        name = fastestBackend()
+    if name not in ("python", "numpy", "numba"):
+        raise ValueError("Unknown backend %r, use python, numpy or numba" % name)
+    if (name == "numpy" and numpy is None) or (name == "numba" and numba is None):
+        raise ValueError("The %s backend needs the module %s, which is not installed" % (name, name))
+    if name == "numba" and "childCornersLoop" not in compiledKernels:
+        compiledKernels["childCornersLoop"] = numba.njit(cache = True)(childCornersLoop)
+    backend = name
+    return backend
+
+compiledKernels = {}
+try:
+    backend = selectBackend()
+except ValueError as error:
+    # A misspelled or missing backend in PYTHAGORAS_BACKEND must not stop the program from starting.
+    warnings.warn("%s. PYTHAGORAS_BACKEND is ignored and the %s backend is used instead." %
+                  (error, fastestBackend()))
+    backend = selectBackend(fastestBackend())
+
 ########################################################################################################
 #
 # GUI creation starts here.
@@ -353,8 +3032,11 @@ def convertToPhotoImage(background, image):
     background: The background of the image.
     image: The Image object that will be converted.
     On exit: A Tk.PhotoImage has been created and the data transferred from the
-             PIL image. The PhotoImage is returned.
+             PIL image, which has first been converted to "RGB" if it is a "P" image.
+             The PhotoImage is returned.
     '''
+    if image.mode != "RGB":
+        image = image.convert("RGB")
     colDict = {}
     newImage = Tk.PhotoImage(width=image.size[0], height=image.size[1])
     newImage.put(background[1], (0, 0, image.size[0], image.size[1]))
@@ -376,6 +3058,8 @@ def createGUI():
     # Initiate Tree object that will be used throughout the GUI creation.
     tree = Tree(10, ((0, 255, 0), "#00FF00"), ((0, 0, 0), "#000000"),
                 ((255, 255, 255), "#FFFFFF"),((0, 0, 0), "#000000"), (45, 45), 1)
+    # Keep the shapes of large trees between sessions.
+    geometryCache.store = GeometryStore(os.path.join(os.path.expanduser("~"), ".pythagoras_tree"), 2 ** 30)
 
     # Create and configure root window.
     root = Tk.Tk()
@@ -400,11 +3084,13 @@ def createGUI():
     angle1Label.grid(row = 6, column = 0,  sticky="W")
     angle2Label = Tk.Label(root, text = " Set the lower right angle:")
     angle2Label.grid(row = 7, column = 0,  sticky="W")
-    dragLabel = Tk.Label(root, text = "Click and drag to position the tree and use +/- to scale it.")
+    dragLabel = Tk.Label(root, text = "Click and drag to position the tree, use +/- to scale it, * or / to zoom and f to fit it.")
     dragLabel.grid(row = 9, column = 3)
+    inspectLabel = Tk.Label(root, text = "Right-click a square to inspect it.")
+    inspectLabel.grid(row = 10, column = 3)
 
     # Create a thumbnail image.
-    img = tree.drawTree((250, 250))
+    img = tree.drawTree((250, 250), cull = tree.order > 16, palette = True)
     tkImage = convertToPhotoImage(tree.background, img)
     thumbnail = Tk.Label(root, image = tkImage) 
     thumbnail.grid(row = 0, column = 3, rowspan=9)
@@ -416,9 +3102,13 @@ def createGUI():
         On exit: A new image has been created with the updated attributes for the object
                  tree and converted to a Tk PhotoImage using convertToPhotoImage(...). The
                  image displayed in the thumbnail Label has been replaced with the new
-                 image. 
+                 image. Trees up to order 16 are drawn from the cached shape so that
+                 moving, scaling and recolouring the tree does not create it again,
+                 higher orders are drawn with only the visible squares. The tree is
+                 drawn as a palette image, so changing only its colours replaces the
+                 palette without drawing the squares again.
         '''
-        img = tree.drawTree((250,250))
+        img = tree.drawTree((250,250), cull = tree.order > 16, palette = True)
         tkImg = convertToPhotoImage(tree.background, img)
         thumbnail.configure(image = tkImg)
         thumbnail.image = tkImg
@@ -540,7 +3230,8 @@ def createGUI():
     iterationsVariable.set("10")
     iterationsMenu = Tk.OptionMenu(root, iterationsVariable, "0", "1", "2", "3",
                                    "4", "5", "6", "7", "8", "9", "10", "11",
-                                   "12", "13", "14", command = changeIterations)
+                                   "12", "13", "14", "15", "16", "17", "18", "19", "20",
+                                   "21", "22", "23", "24", "25", command = changeIterations)
     iterationsMenu.grid(row = 5, column = 1, columnspan = 2)
 
     # Create angle entry fields with callback procedures.
@@ -623,13 +3314,34 @@ def createGUI():
 
     thumbnail.bind("<ButtonRelease-1>", leftMouseUp)
 
+    def inspectSquare(event):
+        '''
+        Shows information about the square that was right-clicked in the thumbnail image.
+
+        event: Tk Event object.
+        On exit: The order, side and angle of the square drawn at the position of the mouse
+                 have been shown in the Label inspectLabel, found with tree.pickSquare(...).
+        '''
+        if numpy is None or tree.order > 16:
+            return
+        square = tree.pickSquare((250, 250), (event.x, event.y))
+        if square is None:
+            inspectLabel.configure(text = "No square at this position.")
+        else:
+            inspectLabel.configure(text = "Order: %d, side: %.2f pixels, angle: %.1f degrees" %
+                                   (square.order, square.side, math.degrees(square.angle)))
+
+    thumbnail.bind("<Button-3>", inspectSquare)
+
     def scale(event):
         '''
-        Updates the scale of the object tree when pressing + or -.
+        Updates the scale of the object tree when pressing +, -, * or /.
 
         event: Tk Event object.
-        On exit: tree.scale has been increased/decreased by 0.1. The procedure
-                 updateImage() has been called.
+        On exit: tree.scale has been increased/decreased by 0.1 for + and -, or the tree
+                 has been zoomed in/out by a factor 2 around the centre of the thumbnail
+                 for * and /, or fitted to the thumbnail with tree.fitToImage(...) for f.
+                 The procedure updateImage() has been called.
         '''
         if event.char == "+":
             tree.scale = tree.scale + 0.1
@@ -637,6 +3349,15 @@ def createGUI():
         if event.char == "-":
             tree.scale = tree.scale - 0.1
             updateImage()
+        if event.char == "*":
+            tree.zoom(2, (250, 250))
+            updateImage()
+        if event.char == "/":
+            tree.zoom(0.5, (250, 250))
+            updateImage()
+        if event.char == "f":
+            tree.fitToImage((250, 250))
+            updateImage()
 
     root.bind("<Key>", scale)
 
@@ -725,7 +3446,7 @@ def createGUI():
         formatVariable = Tk.StringVar(root)
         formatVariable.set(".png")
         formatMenu = Tk.OptionMenu(save_, formatVariable, ".jpg", ".png", ".bmp",
-                                   ".gif")
+                                   ".gif", ".svg", ".pdf")
         formatMenu.grid(row = 0, column = 2)
 
         #Create label and entry field for the image size.
@@ -736,11 +3457,32 @@ def createGUI():
         sizeEntry = Tk.Entry(save_, textvariable = sizeVar, width = 10)
         sizeEntry.grid(row = 1, column = 1)
 
+        #Create label and checkbutton for fitting the tree to the image.
+        fitLabel = Tk.Label(save_, text = " Fit the tree to the image:")
+        fitLabel.grid(row = 2, column = 0, sticky = "W")
+        fitVar = Tk.StringVar(save_)
+        fitVar.set("0")
+        fitButton = Tk.Checkbutton(save_, variable = fitVar)
+        fitButton.grid(row = 2, column = 1)
+
+        #Create label and checkbutton for smoothing the edges of the squares.
+        smoothLabel = Tk.Label(save_, text = " Smooth the edges of the squares:")
+        smoothLabel.grid(row = 3, column = 0, sticky = "W")
+        smoothVar = Tk.StringVar(save_)
+        smoothVar.set("0")
+        smoothButton = Tk.Checkbutton(save_, variable = smoothVar)
+        smoothButton.grid(row = 3, column = 1)
+
         def saveIt():
             '''
             Creates a new image of the specified size and saves it.
 
-            On exit: A new image has been created and saved using drawTree(...).
+            On exit: A new image has been created and saved using drawTree(...), fitting
+                     the tree to the image if fitVar is checked and antialiasing it if
+                     smoothVar is checked. Otherwise the image is saved with a palette,
+                     and PNG images larger than 8192 pixels of trees up to order 20 are
+                     saved with exportTiled(...). SVG and PDF files are saved with
+                     exportVector(...), leaving out the children of squares smaller than a pixel.
                      The save_ window has been destroyed.
             '''
             size = int(sizeVar.get())
@@ -748,7 +3490,19 @@ def createGUI():
             # Change offset to match the large image.
             tree.positionChangex = oldPosition[0] * size / 250.0
             tree.positionChangey = oldPosition[1] * size / 250.0
-            tree.drawTree((size, size), True, nameVar.get() + formatVariable.get())
+            if formatVariable.get() in (".svg", ".pdf"):
+                tree.exportVector((size, size), nameVar.get() + formatVariable.get(), 1.0,
+                                  autoFit = fitVar.get() == "1")
+            elif (size > 8192 and formatVariable.get() == ".png" and smoothVar.get() != "1" and
+                numpy is not None and tree.order <= 20):
+                # Posters are drawn and written in bands instead of as one image.
+                tree.exportTiled((size, size), nameVar.get() + formatVariable.get(),
+                                 autoFit = fitVar.get() == "1")
+            else:
+                tree.drawTree((size, size), True, nameVar.get() + formatVariable.get(),
+                              cull = tree.order > 16, autoFit = fitVar.get() == "1",
+                              antialias = smoothVar.get() == "1" and backend != "python",
+                              palette = smoothVar.get() != "1")
             # Change offset back in case the user want to continue working with the tree.
             tree.positionChangex = oldPosition[0]
             tree.positionChangey = oldPosition[1]           
@@ -764,9 +3518,9 @@ def createGUI():
 
         # Create save and cancel buttons.
         saveImage_ = Tk.Button(save_, text = "Save", command = saveIt)
-        saveImage_.grid(row = 2, column = 0)
+        saveImage_.grid(row = 4, column = 0)
         cancelButton = Tk.Button(save_, text = "Cancel", command = cancel)
-        cancelButton.grid(row = 2, column = 1)
+        cancelButton.grid(row = 4, column = 1)
 
     # Create save button for the root window.     
     saveImage = Tk.Button(root, text = "Save Image", command = saveImage)
@@ -784,5 +3538,5 @@ def createGUI():
     root.protocol("WM_DELETE_WINDOW", killRoot)# If root is dismissed killRoot will be called.
     root.mainloop()
 
-createGUI()
-
+if __name__ == "__main__":
+    createGUI()